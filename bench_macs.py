@@ -0,0 +1,63 @@
+"""Benchmark: macs.parse_macs vs main.normalize_mac (one call per string).
+
+    python bench_macs.py [--count 100000] [--runs 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+# main.py imports offline against an unroutable database (see bench_startup.py)
+os.environ.setdefault("DATABASE_URL", "mysql+pymysql://u:p@192.0.2.1:3306/none")
+os.environ.setdefault("SKIP_SCHEMA_SYNC", "1")
+
+from macs import parse_macs, format_macs  # noqa: E402
+from main import normalize_mac  # noqa: E402
+
+FORMATS = [
+    lambda h: ":".join(h[i:i + 2] for i in range(0, 12, 2)),
+    lambda h: "-".join(h[i:i + 2] for i in range(0, 12, 2)).lower(),
+    lambda h: ".".join(h[i:i + 4] for i in range(0, 12, 4)).lower(),
+    lambda h: h,
+]
+
+
+def sample(count, seed=1):
+    rnd = random.Random(seed)
+    macs = []
+    for _ in range(count):
+        h = f"{rnd.getrandbits(48):012X}"
+        macs.append(rnd.choice(FORMATS)(h) if rnd.random() > 0.02 else h[:9])  # ~2% malformed
+    return macs
+
+
+def timed(fn, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    macs = sample(args.count)
+    expected = [normalize_mac(m) for m in macs]
+    mac, valid = parse_macs(macs)
+    text = format_macs(mac)
+    mismatches = sum(1 for e, t, ok in zip(expected, text, valid) if ok and e != t)
+    assert mismatches == 0, f"{mismatches} MACs normalized differently"
+
+    per_string = timed(lambda: [normalize_mac(m) for m in macs], args.runs)
+    batch = timed(lambda: parse_macs(macs), args.runs)
+    batch_text = timed(lambda: format_macs(parse_macs(macs)[0]), args.runs)
+    print(f"{args.count} MACs, median of {args.runs} runs ({int((~valid).sum())} malformed)")
+    print(f"  normalize_mac loop:          {per_string * 1000:8.1f} ms")
+    print(f"  parse_macs (to int):         {batch * 1000:8.1f} ms  ({per_string / batch:.1f}x)")
+    print(f"  parse_macs + format_macs:    {batch_text * 1000:8.1f} ms  ({per_string / batch_text:.1f}x)")
@@ -0,0 +1,57 @@
+"""Startup benchmark: time `import main` in fresh interpreters, offline.
+
+    python bench_startup.py [--runs 10] [--overhead-budget 0.4] [--budget SECONDS]
+
+FastAPI, pydantic and SQLAlchemy alone take ~0.7 s to import on a small (1 vCPU) box, which
+main can't do anything about, so the budget is on what main adds on top of them: the median
+`import main` minus the median import of just those frameworks (the floor, measured the
+same way). Exits non-zero when that overhead is over --overhead-budget, or when the median
+`import main` is over --budget (absolute, off by default: it depends on the machine).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+FLOOR_SNIPPET = (
+    "import time; t = time.perf_counter(); import fastapi, fastapi.responses, pydantic, sqlalchemy.orm; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def measure(runs, snippet=SNIPPET):
+    # Point at an unroutable database to prove import does no network I/O
+    env = dict(os.environ, DATABASE_URL="mysql+pymysql://u:p@192.0.2.1:3306/none", SKIP_SCHEMA_SYNC="1")
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", snippet], env=env, capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def describe(name, timings):
+    return (f"{name}: median {statistics.median(timings) * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms, "
+            f"max {max(timings) * 1000:.0f} ms over {len(timings)} runs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--overhead-budget", type=float, default=0.4,
+                        help="seconds main may add to the framework imports")
+    parser.add_argument("--budget", type=float, default=None, help="absolute budget for import main (seconds)")
+    args = parser.parse_args()
+
+    floor = measure(args.runs, FLOOR_SNIPPET)
+    timings = measure(args.runs)
+    overhead = statistics.median(timings) - statistics.median(floor)
+    print(describe("frameworks", floor))
+    print(describe("import main", timings))
+    print(f"main's own overhead: {overhead * 1000:.0f} ms (budget {args.overhead_budget * 1000:.0f} ms)")
+    over = overhead > args.overhead_budget
+    if args.budget is not None and statistics.median(timings) > args.budget:
+        print(f"import main is over the absolute budget of {args.budget * 1000:.0f} ms")
+        over = True
+    sys.exit(1 if over else 0)
@@ -0,0 +1,342 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except Exception:
+    redis = None
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")  # local | file | redis
+CACHE_DIR = os.getenv(
+    "CACHE_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "it-api-cache"),
+)
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "10"))
+CACHE_LOCAL_SIZE = int(os.getenv("CACHE_LOCAL_SIZE", "1024"))
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "30"))
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "60"))  # file backend: drop expired files this often
+
+# Namespaces holding data read from the inventory tables; an inventory write bumps all of them
+INVENTORY_NAMESPACES = ("inventory", "portmap", "rollup")
+
+
+class LocalCache:
+    """In-process LRU with per-entry TTL. Also keeps the namespace generations for a single worker."""
+
+    def __init__(self, maxsize=CACHE_LOCAL_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._generations = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            return self._generations[namespace]
+
+    def lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, _ThreadLock())
+
+
+class _ThreadLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        return self._lock.acquire(timeout=timeout)
+
+    def release(self):
+        self._lock.release()
+
+
+class _FileLock:
+    # flock() works across worker processes on the same host
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, timeout):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.utime(fd)  # marks the lock file as in use for FileCache.sweep
+                self._fd = fd
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(0.02)
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class FileCache:
+    """Cache shared by every worker on the host, stored as small JSON files (tmpfs by default).
+
+    An entry file's mtime is its expiry time, so sweep() can drop expired entries (including
+    every entry of a superseded generation, once its TTL has run out) without reading them.
+    """
+
+    def __init__(self, directory=CACHE_DIR, sweep_interval=CACHE_SWEEP_INTERVAL):
+        self.directory = directory
+        self.sweep_interval = sweep_interval
+        self._swept = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _key_path(self, key):
+        return self._path(hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def _write(self, path, data, expires=None):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        if expires is not None:
+            os.utime(tmp, (expires, expires))
+        os.replace(tmp, path)
+
+    def get(self, key):
+        path = self._key_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] < time.time():
+            self._remove(path)
+            return None
+        return entry["value"]
+
+    def set(self, key, value, ttl):
+        expires = time.time() + ttl
+        self._write(self._key_path(key), json.dumps({"expires": expires, "value": value}), expires)
+        self._maybe_sweep()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._swept >= self.sweep_interval:
+            self._swept = time.monotonic()
+            self.sweep()
+
+    def sweep(self):
+        """Delete expired entries, and lock and temp files untouched for a while. Returns the count removed."""
+        now = time.time()
+        stale = now - max(self.sweep_interval, 2 * CACHE_LOCK_TIMEOUT)
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("gen-"):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if mtime < (now if entry.name.endswith(".json") else stale):
+                    self._remove(entry.path)
+                    removed += 1
+        return removed
+
+    def delete(self, key):
+        self._remove(self._key_path(key))
+
+    def generation(self, namespace):
+        try:
+            with open(self._path(f"gen-{namespace}")) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump(self, namespace):
+        lock = _FileLock(self._path(f"gen-{namespace}.lock"))
+        lock.acquire(CACHE_LOCK_TIMEOUT)
+        try:
+            value = self.generation(namespace) + 1
+            self._write(self._path(f"gen-{namespace}"), str(value))
+        finally:
+            lock.release()
+        self._maybe_sweep()
+        return value
+
+    def lock(self, name):
+        return _FileLock(self._path(hashlib.sha1(name.encode()).hexdigest() + ".lock"))
+
+
+class _RedisLock:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = f"lock:{name}"
+        self.token = os.urandom(8).hex()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.client.set(self.name, self.token, nx=True, px=int(CACHE_LOCK_TIMEOUT * 1000)):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def release(self):
+        if self.client.get(self.name) == self.token.encode():
+            self.client.delete(self.name)
+
+
+class RedisCache:
+    """Cache shared across hosts through Redis."""
+
+    def __init__(self, url=CACHE_REDIS_URL):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package installed")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(f"cache:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(f"cache:{key}", json.dumps(value), px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(f"cache:{key}")
+
+    def generation(self, namespace):
+        return int(self.client.get(f"gen:{namespace}") or 0)
+
+    def bump(self, namespace):
+        return int(self.client.incr(f"gen:{namespace}"))
+
+    def lock(self, name):
+        return _RedisLock(self.client, name)
+
+
+class InventoryCache:
+    """Namespaced cache with generation-based invalidation and cross-worker single flight.
+
+    Values must be JSON-serializable. With a shared backend a local LRU sits in front of it;
+    local entries are only served while their namespace generation matches the shared one, so
+    an invalidation in any worker is seen by all of them on their next read.
+    """
+
+    def __init__(self, backend=CACHE_BACKEND, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self.local = LocalCache()
+        if backend == "file":
+            self.shared = FileCache()
+        elif backend == "redis":
+            self.shared = RedisCache()
+        else:
+            self.shared = None
+        self.backend = backend
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _store(self):
+        return self.shared or self.local
+
+    def _key(self, namespace, key, generation):
+        return f"{namespace}:{generation}:{key}"
+
+    def generation(self, namespace):
+        return self._store().generation(namespace)
+
+    def get(self, namespace, key, generation=None):
+        if generation is None:
+            generation = self.generation(namespace)
+        full_key = self._key(namespace, key, generation)
+        value = self.local.get(full_key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(full_key)
+            if value is not None:
+                self.local.set(full_key, value, self.ttl)
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, namespace, key, value, ttl=None, generation=None):
+        """Store under `generation`: read it before computing the value, so an invalidation that lands
+        meanwhile leaves the value under the superseded generation instead of serving it as current."""
+        ttl = self.ttl if ttl is None else ttl
+        if generation is None:
+            generation = self.generation(namespace)
+        full_key = self._key(namespace, key, generation)
+        self.local.set(full_key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(full_key, value, ttl)
+
+    def invalidate(self, namespace):
+        self.stats["invalidations"] += 1
+        return self._store().bump(namespace)
+
+    async def get_or_compute(self, namespace, key, compute, ttl=None):
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+        # Only one worker recomputes; the others wait for its result instead of repeating the work
+        lock = self._store().lock(f"{namespace}:{key}")
+        acquired = await asyncio.to_thread(lock.acquire, CACHE_LOCK_TIMEOUT)
+        try:
+            generation = self.generation(namespace)
+            value = self.get(namespace, key, generation)
+            if value is not None:
+                return value
+            value = await compute()
+            self.set(namespace, key, value, ttl, generation)
+            return value
+        finally:
+            if acquired:
+                lock.release()
+
+    def metrics(self):
+        return {"backend": self.backend, "local_entries": len(self.local._data), **self.stats}
+
+
+inventory_cache = InventoryCache()
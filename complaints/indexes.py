@@ -0,0 +1,51 @@
+"""Index check/migration for complaint listing on the Planka database.
+
+    python -m complaints.indexes          # report whether the index exists
+    python -m complaints.indexes --apply  # create it (CONCURRENTLY, no table lock)
+"""
+import argparse
+
+from sqlalchemy import text
+
+from .db import get_engine
+
+CARD_LIST_INDEX = "card_list_id_created_at_id_idx"
+
+
+def find_card_list_index(engine):
+    # Any index leading with (list_id, created_at) serves the keyset query, whatever its name
+    q = text(
+        "SELECT indexname, indexdef FROM pg_indexes"
+        " WHERE schemaname = 'public' AND tablename = 'card'"
+        " AND replace(indexdef, ' DESC', '') LIKE '%(list_id, created_at%'"
+    )
+    with engine.connect() as conn:
+        row = conn.execute(q).mappings().fetchone()
+    return dict(row) if row else None
+
+
+def ensure_card_list_index(engine):
+    existing = find_card_list_index(engine)
+    if existing:
+        return existing, False
+    ddl = text(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {CARD_LIST_INDEX}"
+        " ON public.card (list_id, created_at DESC, id DESC)"
+    )
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(ddl)
+    return find_card_list_index(engine), True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apply", action="store_true", help="create the index if it is missing")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.apply:
+        index, created = ensure_card_list_index(engine)
+        print(("Created: " if created else "Already present: ") + index["indexdef"])
+    else:
+        index = find_card_list_index(engine)
+        print(index["indexdef"] if index else f"Missing: run with --apply to create {CARD_LIST_INDEX}")
@@ -1,49 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy import text
-from typing import List
+import base64
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import text, bindparam
+from typing import List, Optional
+from datetime import datetime
 
-from .db import get_complaint_db, engine
-from .schemas import ComplaintCreate, ComplaintResponse
+from cache import InventoryCache
 
-# Apprise configuration: set APPRISE_URLS in env (comma-separated apprise service URLs)
-APPRISE_URLS = "tgram://8028665172:AAHFj5vwi5HGKpgZTAbwaG4QakxlHjZhmvY/204621342"
+from .db import get_complaint_db
+from .schemas import ComplaintCreate, ComplaintResponse, ComplaintAccepted, ComplaintDelivery
+from .notify import notifier
+from .outbox import outbox
+from .routing import routing_table
 
 router = APIRouter()
 
-try:
-    import apprise
-except Exception:
-    apprise = None
+MAX_LIST_LIMIT = int(os.getenv("COMPLAINT_MAX_LIST_LIMIT", "200"))
+COMPLAINT_CACHE_TTL = float(os.getenv("COMPLAINT_CACHE_TTL", "5"))
 
-
-def notify_apprise(title: str, body: str):
-    """Send a notification using Apprise if configured."""
-    if not apprise:
-        return
-    if not APPRISE_URLS:
-        return
-    try:
-        a = apprise.Apprise()
-        for url in APPRISE_URLS.split(','):
-            url = url.strip()
-            if url:
-                a.add(url)
-        a.notify(title=title, body=body)
-    except Exception:
-        # swallow errors to avoid breaking main request flow
-        return
-
-# Configure these constants for your target list/board
-TARGET_PROJECT_ID = 1700906029732070999
-TARGET_BOARD_ID = 1700906101530166873
-TARGET_LIST_ID = 1700907504793290333
-DEFAULT_POSITION_INCREMENT = 65536.0
-DEFAULT_CARD_TYPE = 'project'  # follow board's default_card_type
+# Read-through cache for list pages and cards; a new card reaching Planka invalidates it
+complaint_cache = InventoryCache(ttl=COMPLAINT_CACHE_TTL)
+outbox.on_delivered.append(lambda list_ids: complaint_cache.invalidate("complaints"))
 
 
-@router.post("/", response_model=ComplaintResponse, status_code=status.HTTP_201_CREATED)
-def create_complaint(complaint: ComplaintCreate, background_tasks: BackgroundTasks, db=Depends(get_complaint_db)):
-    """Create a new complaint as a card in the Planka `card` table under the specified list."""
+@router.post("/", response_model=ComplaintAccepted, status_code=status.HTTP_202_ACCEPTED)
+def create_complaint(complaint: ComplaintCreate):
+    """Accept a complaint into the local outbox; it becomes a Planka card in its routed list shortly after."""
     # Prepare name and description (embed reporter info if provided)
     name = complaint.name
     description_parts = []
@@ -56,73 +38,118 @@ def create_complaint(complaint: ComplaintCreate, background_tasks: BackgroundTas
 
     description = "\n\n".join(description_parts) if description_parts else None
 
-    # Insert the card
-    insert_sql = text(
-        "INSERT INTO public.card (board_id, list_id, type, position, name, description, created_at, comments_total)"
-        " VALUES (:board_id, :list_id, :type, :position, :name, :description, NOW(), 0)"
-        " RETURNING id, board_id, list_id, type, position, name, description, created_at"
-    )
-
-    params = {
-        'board_id': TARGET_BOARD_ID,
-        'list_id': TARGET_LIST_ID,
-        'type': DEFAULT_CARD_TYPE,
-        'position': DEFAULT_POSITION_INCREMENT,
-        'name': name,
-        'description': description,
-    }
-
+    # Routing is an in-memory lookup and the outbox a local SQLite write: no Planka round trip here
+    route = routing_table.resolve(complaint)
     try:
-        with db.begin():
-            res = db.execute(insert_sql, params)
-            row = res.fetchone()
-            if not row:
-                raise HTTPException(status_code=500, detail="Failed to create complaint card")
-            created = dict(row._mapping)
-
-            # Schedule Apprise notification (if configured)
-            msg_title = f"تم تقديم بلاغ جديد من:  {created['name']}"
-            msg_body = f"ID: {created['id']}\n\n{created.get('description','') or ''}"
-            background_tasks.add_task(notify_apprise, msg_title, msg_body)
-
-            return ComplaintResponse(**{
-                'id': created['id'],
-                'board_id': created['board_id'],
-                'list_id': created['list_id'],
-                'name': created['name'],
-                'description': created['description'],
-                'created_at': created['created_at'].isoformat() if created.get('created_at') else None,
-            })
+        accepted = outbox.enqueue(route.board_id, route.list_id, name, description)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return ComplaintAccepted(**{
+        'outbox_id': accepted['outbox_id'],
+        'status': accepted['status'],
+        'board_id': route.board_id,
+        'list_id': route.list_id,
+        'created_at': datetime.fromtimestamp(accepted['created_at']).isoformat(),
+    })
 
 
-@router.get("/", response_model=List[ComplaintResponse])
-def list_complaints(limit: int = 50, db=Depends(get_complaint_db)):
-    """List recent complaints (cards) from the target list."""
-    q = text("SELECT id, board_id, list_id, name, description, created_at FROM public.card WHERE list_id = :lid ORDER BY created_at DESC LIMIT :lim")
-    rows = db.execute(q, {'lid': TARGET_LIST_ID, 'lim': limit}).mappings().fetchall()
-    return [ComplaintResponse(**{
+@router.get("/outbox/metrics")
+def outbox_metrics():
+    return outbox.metrics()
+
+
+@router.get("/outbox/{outbox_id}", response_model=ComplaintDelivery)
+def get_complaint_delivery(outbox_id: int):
+    """Delivery status of an accepted complaint; `card_id` is set once it reaches Planka."""
+    row = outbox.get(outbox_id)
+    if not row:
+        raise HTTPException(status_code=404, detail='Complaint not found in outbox')
+    return ComplaintDelivery(**{
+        'outbox_id': row['id'],
+        'status': row['status'],
+        'card_id': row['card_id'] if row['status'] == 'delivered' else None,
+        'list_id': row['list_id'],
+        'attempts': row['attempts'],
+        'last_error': row['last_error'],
+        'created_at': datetime.fromtimestamp(row['created_at']).isoformat(),
+        'delivered_at': datetime.fromtimestamp(row['delivered_at']).isoformat() if row['delivered_at'] else None,
+    })
+
+
+def _card_dict(r):
+    return {
         'id': r['id'],
         'board_id': r['board_id'],
         'list_id': r['list_id'],
         'name': r['name'],
         'description': r.get('description'),
         'created_at': r['created_at'].isoformat() if r.get('created_at') else None,
-    }) for r in rows]
+    }
+
+
+def encode_cursor(card):
+    return base64.urlsafe_b64encode(f"{card['created_at']}|{card['id']}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, card_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(card_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+@router.get("/", response_model=List[ComplaintResponse])
+def list_complaints(response: Response, limit: int = Query(50, ge=1), cursor: Optional[str] = None, list_id: Optional[int] = None, db=Depends(get_complaint_db)):
+    """List complaints (cards) across every routed list (or just `list_id`), newest first.
+
+    Pages are keyed on (created_at, id): pass the `X-Next-Cursor` response header back as `cursor`.
+    """
+    limit = min(limit, MAX_LIST_LIMIT)
+    list_ids = routing_table.list_ids()
+    if list_id is not None:
+        if list_id not in list_ids:
+            raise HTTPException(status_code=404, detail='List is not a complaint list')
+        list_ids = [list_id]
+    cache_key = f"list:{','.join(map(str, list_ids))}:{limit}:{cursor or ''}"
+    generation = complaint_cache.generation("complaints")
+    page = complaint_cache.get("complaints", cache_key, generation)
+    if page is None:
+        # One query over all lists; the database merges and orders them
+        params = {'lids': list_ids, 'lim': limit + 1}
+        where = "list_id IN :lids"
+        if cursor:
+            params['c_at'], params['c_id'] = decode_cursor(cursor)
+            where += " AND (created_at, id) < (:c_at, :c_id)"
+        q = text(
+            "SELECT id, board_id, list_id, name, description, created_at FROM public.card"
+            f" WHERE {where} ORDER BY created_at DESC, id DESC LIMIT :lim"
+        ).bindparams(bindparam('lids', expanding=True))
+        rows = [_card_dict(r) for r in db.execute(q, params).mappings().fetchall()]
+        page = {
+            'items': rows[:limit],
+            'next_cursor': encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+        }
+        complaint_cache.set("complaints", cache_key, page, generation=generation)
+    if page['next_cursor']:
+        response.headers['X-Next-Cursor'] = page['next_cursor']
+    return [ComplaintResponse(**r) for r in page['items']]
 
 
 @router.get("/{card_id}", response_model=ComplaintResponse)
 def get_complaint(card_id: int, db=Depends(get_complaint_db)):
-    q = text("SELECT id, board_id, list_id, name, description, created_at FROM public.card WHERE id = :id LIMIT 1")
-    row = db.execute(q, {'id': card_id}).mappings().fetchone()
-    if not row:
-        raise HTTPException(status_code=404, detail='Complaint not found')
-    return ComplaintResponse(**{
-        'id': row['id'],
-        'board_id': row['board_id'],
-        'list_id': row['list_id'],
-        'name': row['name'],
-        'description': row.get('description'),
-        'created_at': row['created_at'].isoformat() if row.get('created_at') else None,
-    })
+    generation = complaint_cache.generation("complaints")
+    card = complaint_cache.get("complaints", f"card:{card_id}", generation)
+    if card is None:
+        q = text("SELECT id, board_id, list_id, name, description, created_at FROM public.card WHERE id = :id LIMIT 1")
+        row = db.execute(q, {'id': card_id}).mappings().fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail='Complaint not found')
+        card = _card_dict(row)
+        complaint_cache.set("complaints", f"card:{card_id}", card, generation=generation)
+    return ComplaintResponse(**card)
+
+
+@router.get("/notifications/metrics")
+def notification_metrics():
+    return notifier.metrics()
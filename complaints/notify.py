@@ -0,0 +1,165 @@
+import os
+import queue
+import threading
+import time
+
+# Apprise configuration: comma-separated apprise service URLs
+APPRISE_URLS = os.getenv("APPRISE_URLS", "tgram://8028665172:AAHFj5vwi5HGKpgZTAbwaG4QakxlHjZhmvY/204621342")
+
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "1000"))
+NOTIFY_COALESCE_WINDOW = float(os.getenv("NOTIFY_COALESCE_WINDOW", "5"))
+NOTIFY_MAX_BATCH = int(os.getenv("NOTIFY_MAX_BATCH", "20"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "5"))
+NOTIFY_BACKOFF = float(os.getenv("NOTIFY_BACKOFF", "2"))
+
+_STOP = object()
+
+
+class NotificationWorker:
+    """Single background sender: bounded queue, one reused Apprise instance, digests and retries."""
+
+    def __init__(
+        self,
+        urls=APPRISE_URLS,
+        maxsize=NOTIFY_QUEUE_SIZE,
+        coalesce_window=NOTIFY_COALESCE_WINDOW,
+        max_batch=NOTIFY_MAX_BATCH,
+        max_retries=NOTIFY_MAX_RETRIES,
+        backoff=NOTIFY_BACKOFF,
+    ):
+        self.urls = [u.strip() for u in (urls or "").split(",") if u.strip()]
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._apprise = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "sent_messages": 0,
+            "sent_complaints": 0,
+            "digests": 0,
+            "retries": 0,
+            "failures": 0,
+            "last_send_latency": None,
+            "total_send_latency": 0.0,
+        }
+
+    def _client(self):
+        if self._apprise is None:
+            import apprise  # optional and slow to import, so only when something is sent
+            a = apprise.Apprise()
+            for url in self.urls:
+                a.add(url)
+            self._apprise = a
+        return self._apprise
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="complaint-notifier", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        # Drain what is already queued, then exit
+        if self._thread is None:
+            return
+        self._stopping.set()
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, title, body):
+        """Queue a notification; never blocks the caller. Returns False when it had to be dropped."""
+        if not self.urls:
+            return False
+        self.start()
+        try:
+            self.queue.put_nowait((title, body))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["submitted"] += 1
+        return True
+
+    def _collect(self, first):
+        # Anything arriving within the window is folded into the same message
+        batch = [first]
+        deadline = time.monotonic() + self.coalesce_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.queue.put_nowait(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _format(self, batch):
+        if len(batch) == 1:
+            return batch[0]
+        title = f"تم تقديم {len(batch)} بلاغات جديدة"
+        body = "\n\n---\n\n".join(f"{t}\n{b}" for t, b in batch)
+        return title, body
+
+    def _send(self, title, body):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                ok = self._client().notify(title=title, body=body)
+            except Exception as e:
+                print(f"Notification error: {e}")
+                ok = False
+            latency = time.perf_counter() - started
+            self.stats["last_send_latency"] = round(latency, 3)
+            self.stats["total_send_latency"] += latency
+            if ok:
+                return True
+            if attempt < self.max_retries:
+                # While shutting down, give up instead of holding stop() for the whole backoff
+                if self._stopping.wait(self.backoff * 2 ** attempt):
+                    break
+                self.stats["retries"] += 1
+        return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            batch = self._collect(item)
+            title, body = self._format(batch)
+            if self._send(title, body):
+                self.stats["sent_messages"] += 1
+                self.stats["sent_complaints"] += len(batch)
+                if len(batch) > 1:
+                    self.stats["digests"] += 1
+            else:
+                self.stats["failures"] += 1
+                print(f"Notification failed, dropping {len(batch)} complaints")
+
+    def metrics(self):
+        attempts = self.stats["sent_messages"] + self.stats["failures"] + self.stats["retries"]
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "avg_send_latency": round(self.stats["total_send_latency"] / attempts, 3) if attempts else None,
+            **{k: v for k, v in self.stats.items() if k != "total_send_latency"},
+        }
+
+
+notifier = NotificationWorker()
@@ -0,0 +1,327 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from sqlalchemy import exc, text, bindparam
+
+from .db import get_engine
+from .notify import notifier
+
+COMPLAINT_OUTBOX_PATH = os.getenv("COMPLAINT_OUTBOX_PATH", os.path.join(os.path.dirname(__file__), "outbox.db"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_FLUSH_INTERVAL = float(os.getenv("OUTBOX_FLUSH_INTERVAL", "2"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "60"))  # a claimed batch not finished this long is picked up again
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))  # rejected on its own this often -> 'failed'
+
+DEFAULT_POSITION_INCREMENT = 65536.0
+DEFAULT_CARD_TYPE = 'project'  # follow board's default_card_type
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    board_id INTEGER NOT NULL,
+    list_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    card_id INTEGER,
+    position REAL,
+    created_at REAL NOT NULL,
+    delivered_at REAL,
+    next_attempt_at REAL NOT NULL,
+    worker TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt_at);
+"""
+# Added after the first release; outbox files created before get them on open
+COLUMNS = {"worker": "TEXT", "lease_until": "REAL"}
+
+EXISTING_CARDS_SQL = text("SELECT id FROM public.card WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+
+# Serializes card positions per list across workers; taken in list order so two batches can't deadlock
+LIST_LOCK_SQL = text("SELECT pg_advisory_xact_lock(:list_id)")
+MAX_POSITIONS_SQL = text(
+    "SELECT list_id, MAX(position) AS position FROM public.card WHERE list_id IN :list_ids GROUP BY list_id"
+).bindparams(bindparam("list_ids", expanding=True))
+
+
+def _transient(e):
+    # Planka unreachable (or not even configured): says nothing about the rows being sent
+    return not isinstance(e, exc.DBAPIError) or isinstance(e, (exc.OperationalError, exc.InterfaceError))
+
+
+class ComplaintOutbox:
+    """Durable local queue (SQLite in WAL mode) of complaints waiting to become Planka cards.
+
+    Rows go pending -> sending -> delivered, or -> failed once Planka has rejected a row sent on
+    its own OUTBOX_MAX_ATTEMPTS times. Every API worker runs a flusher on the same file: batches
+    are claimed under BEGIN IMMEDIATE with a lease, so no two workers send the same row. The new
+    card ids are written to the row before the Planka transaction commits; a row found in
+    'sending' with a card id (a crash between the two commits) is checked against Planka before
+    it is sent again.
+    """
+
+    def __init__(self, path=COMPLAINT_OUTBOX_PATH, batch_size=OUTBOX_BATCH_SIZE, interval=OUTBOX_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._ready = False
+        self.worker = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.on_delivered = []  # callbacks(list_ids) run after each delivered batch
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            have = {r["name"] for r in conn.execute("PRAGMA table_info(outbox)")}
+            for name, kind in COLUMNS.items():
+                if name not in have:
+                    conn.execute(f"ALTER TABLE outbox ADD COLUMN {name} {kind}")
+            self._ready = True
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def _write(self, conn, sql, rows):
+        # One transaction for the whole executemany (autocommit would commit row by row)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount
+
+    def enqueue(self, board_id, list_id, name, description):
+        now = time.time()
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "INSERT INTO outbox (board_id, list_id, name, description, created_at, next_attempt_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (board_id, list_id, name, description, now, now),
+            )
+            outbox_id = cur.lastrowid
+        finally:
+            conn.close()
+        self.start()
+        self._wake.set()
+        return {"outbox_id": outbox_id, "status": "pending", "created_at": now}
+
+    def get(self, outbox_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM outbox WHERE id = ?", (outbox_id,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def _claim(self, conn):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same row
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Leases that ran out belong to a worker that died mid-batch; any card ids it wrote are checked
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', worker = NULL, lease_until = NULL"
+                " WHERE status = 'sending' AND lease_until < ?",
+                (now,),
+            )
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', worker = ?, lease_until = ? WHERE id = ?",
+                [(self.worker, now + OUTBOX_LEASE, r["id"]) for r in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _record(self, conn, pairs):
+        # Card ids go to the outbox before Planka commits, fenced by our lease: if another worker has
+        # taken the rows over, this raises and the Planka transaction rolls back
+        written = self._write(
+            conn,
+            "UPDATE outbox SET card_id = ?, position = ?, lease_until = ? WHERE id = ? AND worker = ? AND status = 'sending'",
+            [(c["id"], float(c["position"]), time.time() + OUTBOX_LEASE, r["id"], self.worker) for r, c in pairs],
+        )
+        if written != len(pairs):
+            raise RuntimeError("outbox lease lost before Planka commit")
+
+    def _confirm(self, rows):
+        """Split claimed rows into (already delivered, to send): rows with a card id may have reached Planka."""
+        recorded = [r for r in rows if r["card_id"] is not None]
+        if not recorded:
+            return [], list(rows)
+        with get_engine().connect() as pg:
+            existing = {r.id for r in pg.execute(EXISTING_CARDS_SQL, {"ids": [r["card_id"] for r in recorded]})}
+        delivered = [
+            (r, {"id": r["card_id"], "list_id": r["list_id"], "position": r["position"],
+                 "name": r["name"], "description": r["description"]})
+            for r in recorded if r["card_id"] in existing
+        ]
+        return delivered, [r for r in rows if r["card_id"] not in existing]
+
+    def _deliver(self, conn, rows):
+        # One transaction: lock the lists, read their max positions, then a single multi-row INSERT.
+        # Positions are read under the lock every time: other workers and the Planka UI add cards too
+        list_ids = sorted({r["list_id"] for r in rows})
+        values, params, expected = [], {}, {}
+        with get_engine().begin() as pg:
+            for list_id in list_ids:
+                pg.execute(LIST_LOCK_SQL, {"list_id": list_id})
+            positions = {l: 0.0 for l in list_ids}
+            positions.update({
+                r.list_id: r.position or 0.0
+                for r in pg.execute(MAX_POSITIONS_SQL, {"list_ids": list_ids})
+            })
+            for i, r in enumerate(rows):
+                position = positions.get(r["list_id"], 0.0) + DEFAULT_POSITION_INCREMENT
+                positions[r["list_id"]] = position
+                values.append(
+                    f"(:board_id_{i}, :list_id_{i}, :type_{i}, :position_{i}, :name_{i}, :description_{i}, NOW(), 0)"
+                )
+                params.update({
+                    f"board_id_{i}": r["board_id"],
+                    f"list_id_{i}": r["list_id"],
+                    f"type_{i}": DEFAULT_CARD_TYPE,
+                    f"position_{i}": position,
+                    f"name_{i}": r["name"],
+                    f"description_{i}": r["description"],
+                })
+                expected[(r["list_id"], position)] = r
+            created = pg.execute(text(
+                "INSERT INTO public.card (board_id, list_id, type, position, name, description, created_at, comments_total)"
+                " VALUES " + ", ".join(values) +
+                " RETURNING id, list_id, position, name, description"
+            ), params).mappings().fetchall()
+            # (list_id, position) is unique within the batch, so it maps cards back to outbox rows
+            delivered = [(expected[(c["list_id"], float(c["position"]))], c) for c in created]
+            self._record(conn, delivered)
+        return delivered
+
+    def _send(self, conn, rows):
+        delivered, rest = self._confirm(rows)
+        return delivered + (self._deliver(conn, rest) if rest else [])
+
+    def _retry_later(self, conn, rows, error, alone):
+        """Hand rows back with backoff. Only a row Planka rejected on its own counts towards 'failed'."""
+        now = time.time()
+        dead = alone and not _transient(error)
+        self._write(
+            conn,
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, next_attempt_at = ?,"
+            " worker = NULL, lease_until = NULL WHERE id = ? AND worker = ?",
+            [
+                (
+                    "failed" if dead and r["attempts"] + 1 >= OUTBOX_MAX_ATTEMPTS else "pending",
+                    str(error)[:500],
+                    now + min(OUTBOX_MAX_BACKOFF, self.interval * 2 ** r["attempts"]),
+                    r["id"],
+                    self.worker,
+                )
+                for r in rows
+            ],
+        )
+
+    def flush(self):
+        conn = self._connect()
+        try:
+            rows = self._claim(conn)
+            if not rows:
+                return 0
+            delivered, rows = [], list(rows)
+            try:
+                delivered, rows = self._send(conn, rows), []
+            except Exception as e:
+                print(f"Outbox flush failed for {len(rows)} complaints: {e}")
+                if len(rows) == 1 or _transient(e):
+                    self._retry_later(conn, rows, e, alone=len(rows) == 1)
+                    rows = []
+            # One row Planka rejects fails the whole multi-row INSERT; send them one at a time so it
+            # can't hold up the rest
+            for i, r in enumerate(rows):
+                try:
+                    delivered += self._send(conn, [r])
+                except Exception as e:
+                    print(f"Outbox delivery failed for complaint {r['id']}: {e}")
+                    if _transient(e):
+                        self._retry_later(conn, rows[i:], e, alone=False)
+                        break
+                    self._retry_later(conn, [r], e, alone=True)
+            if delivered:
+                self._write(
+                    conn,
+                    "UPDATE outbox SET status = 'delivered', card_id = ?, position = ?, delivered_at = ?,"
+                    " attempts = attempts + 1, last_error = NULL, worker = NULL, lease_until = NULL WHERE id = ?",
+                    [(c["id"], float(c["position"]), time.time(), r["id"]) for r, c in delivered],
+                )
+        finally:
+            conn.close()
+
+        if delivered:
+            for callback in self.on_delivered:
+                callback({r["list_id"] for r, _ in delivered})
+        for r, c in delivered:
+            notifier.submit(f"تم تقديم بلاغ جديد من:  {c['name']}", f"ID: {c['id']}\n\n{c.get('description') or ''}")
+        return len(delivered)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                # Keep draining while full batches come back
+                while self.flush() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="complaint-outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def metrics(self):
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            "pending": counts.get("pending", 0),
+            "sending": counts.get("sending", 0),
+            "delivered": counts.get("delivered", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_pending_age": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+
+outbox = ComplaintOutbox()
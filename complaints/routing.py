@@ -0,0 +1,82 @@
+"""Complaint routing table: which Planka project/board/list a complaint lands in.
+
+Loaded once from COMPLAINT_ROUTES_FILE (JSON) and kept in memory:
+
+    {
+        "default": {"project_id": 1, "board_id": 2, "list_id": 3},
+        "rules": [
+            {"match": {"floor": 3}, "route": {"project_id": 1, "board_id": 2, "list_id": 4}},
+            {"match": {"category": "network"}, "route": {...}},
+            {"match": {"reporter_email": "icu@example.com"}, "route": {...}}
+        ]
+    }
+
+Rules are tried in order; every key in `match` must equal the complaint's field
+(strings compare case-insensitively). No file means everything goes to the default list.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+
+COMPLAINT_ROUTES_FILE = os.getenv("COMPLAINT_ROUTES_FILE", os.path.join(os.path.dirname(__file__), "routes.json"))
+
+# The original single target, used when no routes file overrides it
+TARGET_PROJECT_ID = 1700906029732070999
+TARGET_BOARD_ID = 1700906101530166873
+TARGET_LIST_ID = 1700907504793290333
+
+MATCH_FIELDS = ("floor", "category", "reporter_name", "reporter_email")
+
+Route = namedtuple("Route", ["project_id", "board_id", "list_id"])
+
+
+def _route(data):
+    return Route(int(data["project_id"]), int(data["board_id"]), int(data["list_id"]))
+
+
+def _norm(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+class RoutingTable:
+    def __init__(self, path=COMPLAINT_ROUTES_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.default = Route(TARGET_PROJECT_ID, TARGET_BOARD_ID, TARGET_LIST_ID)
+        self.rules = []
+
+    def load(self):
+        default = Route(TARGET_PROJECT_ID, TARGET_BOARD_ID, TARGET_LIST_ID)
+        rules = []
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                config = json.load(f)
+            if config.get("default"):
+                default = _route(config["default"])
+            for rule in config.get("rules", []):
+                unknown = set(rule["match"]) - set(MATCH_FIELDS)
+                if unknown:
+                    raise ValueError(f"Unknown complaint routing fields: {sorted(unknown)}")
+                rules.append(({k: _norm(v) for k, v in rule["match"].items()}, _route(rule["route"])))
+        with self._lock:
+            self.default, self.rules, self._loaded = default, rules, True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def resolve(self, complaint):
+        self._ensure_loaded()
+        for match, route in self.rules:
+            if all(_norm(getattr(complaint, field, None)) == value for field, value in match.items()):
+                return route
+        return self.default
+
+    def list_ids(self):
+        self._ensure_loaded()
+        return sorted({self.default.list_id, *(route.list_id for _, route in self.rules)})
+
+
+routing_table = RoutingTable()
@@ -6,6 +6,8 @@ class ComplaintCreate(BaseModel):
     description: Optional[str] = Field(None, description="Detailed description")
     reporter_name: Optional[str] = Field(None)
     reporter_email: Optional[str] = Field(None)
+    floor: Optional[int] = Field(None, description="Used to route the complaint to a floor's list")
+    category: Optional[str] = Field(None, description="Used to route the complaint to a category's list")
 
 class ComplaintResponse(BaseModel):
     id: int
@@ -14,3 +16,20 @@ class ComplaintResponse(BaseModel):
     name: str
     description: Optional[str]
     created_at: Optional[str]
+
+class ComplaintAccepted(BaseModel):
+    outbox_id: int
+    status: str
+    board_id: int
+    list_id: int
+    created_at: str
+
+class ComplaintDelivery(BaseModel):
+    outbox_id: int
+    status: str
+    card_id: Optional[int]
+    list_id: int
+    attempts: int
+    last_error: Optional[str]
+    created_at: str
+    delivered_at: Optional[str]
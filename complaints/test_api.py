@@ -22,8 +22,17 @@ lresp = client.get('/complaints/')
 print('LIST Status:', lresp.status_code)
 print('LIST JSON sample count:', len(lresp.json()))
 
-# Fetch the created complaint by id
-created_id = resp.json().get('id')
+# Wait for the outbox to deliver it, then fetch the created card by id
+import time
+outbox_id = resp.json().get('outbox_id')
+created_id = None
+for _ in range(20):
+    oresp = client.get(f'/complaints/outbox/{outbox_id}')
+    created_id = oresp.json().get('card_id')
+    if created_id:
+        break
+    time.sleep(0.5)
+print('OUTBOX JSON:', oresp.json())
 if created_id:
     greq = client.get(f'/complaints/{created_id}')
     print('GET Status:', greq.status_code)
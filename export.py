@@ -0,0 +1,122 @@
+"""Spreadsheet exports of the inventory, streamed row by row from server-side cursors.
+
+Rows are read with `yield_per` (a streaming cursor on MySQL) and written out as they
+arrive, so memory stays flat however many rows there are. XLSX goes through openpyxl's
+write-only workbook, which spools to a temp file that is then streamed back.
+"""
+import csv
+import io
+import os
+import tempfile
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+import models
+from db import read_session
+
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def devices_query():
+    d = models.Devices
+    return select(
+        d.id, d.type, d.name, d.model, d.floor, d.place, d.cableNumber,
+        d.Mac, d.IP, d.Notes, d.show, d.active, d.Date,
+    ).order_by(d.id)
+
+
+def ports_query():
+    p, s, d = models.Ports, models.Switches, models.Devices
+    return (
+        select(
+            s.id.label("switch_id"), s.unique_id.label("switch_unique_id"), s.name.label("switch_name"),
+            s.floor.label("switch_floor"), s.IP.label("switch_ip"),
+            p.id.label("port_id"), p.port_number, p.title.label("port_title"),
+            d.id.label("device_id"), d.name.label("device_name"), d.type.label("device_type"),
+            d.Mac.label("device_mac"), d.IP.label("device_ip"), d.cableNumber.label("device_cable_number"),
+        )
+        .select_from(p)
+        .join(s, p.switch_id == s.id)
+        .outerjoin(d, p.device_id == d.id)
+        .order_by(s.id, p.port_number)
+    )
+
+
+def patchpanel_ports_query():
+    pp, ppp, p, s = models.PatchPanels, models.PatchPanelPorts, models.Ports, aliased(models.Switches)
+    return (
+        select(
+            pp.id.label("patch_panel_id"), pp.unique_id.label("patch_panel_unique_id"),
+            pp.title.label("patch_panel_title"), pp.floor,
+            ppp.id.label("port_id"), ppp.port_number, ppp.title.label("port_title"),
+            ppp.cable_number, ppp.cable_length, ppp.function,
+            s.name.label("switch_name"), p.port_number.label("switch_port_number"),
+        )
+        .select_from(ppp)
+        .join(pp, ppp.patch_panel_id == pp.id)
+        .outerjoin(p, ppp.switch_port_id == p.id)
+        .outerjoin(s, p.switch_id == s.id)
+        .order_by(pp.id, ppp.port_number)
+    )
+
+
+EXPORTS = {
+    "devices": devices_query,
+    "ports": ports_query,
+    "patchpanels": patchpanel_ports_query,
+}
+
+
+def stream_rows(query):
+    """Yield the header, then every row, holding at most `EXPORT_YIELD_PER` rows in memory."""
+    db = read_session()
+    try:
+        result = db.execute(query.execution_options(yield_per=EXPORT_YIELD_PER))
+        yield list(result.keys())
+        for row in result:
+            yield list(row)
+    finally:
+        db.close()
+
+
+def iter_csv(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")  # so Excel opens Arabic text as UTF-8
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= EXPORT_CHUNK_SIZE:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_xlsx(rows, title, Workbook):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    for row in rows:
+        ws.append(row)
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while chunk := f.read(EXPORT_CHUNK_SIZE):
+            yield chunk
+
+
+def export(kind, fmt):
+    """Byte chunks of the `kind` export in `fmt` ("csv" or "xlsx")."""
+    if fmt == "xlsx":
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("XLSX export needs openpyxl installed")
+        return iter_xlsx(stream_rows(EXPORTS[kind]()), kind, Workbook)
+    return iter_csv(stream_rows(EXPORTS[kind]()))
@@ -0,0 +1,267 @@
+import asyncio
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import insert, select
+
+import models
+from db import session
+
+
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "10"))
+HISTORY_FLUSH_BATCH = int(os.getenv("HISTORY_FLUSH_BATCH", "500"))
+HISTORY_RTT_BUCKET = int(os.getenv("HISTORY_RTT_BUCKET", "300"))  # seconds per stored RTT aggregate
+RTT_PERCENTILES = (50, 90, 95, 99)
+
+# Log-spaced RTT bins (ms): bin i covers [RTT_BIN_BASE * RTT_BIN_RATIO**i, ... **(i + 1)), the first
+# and last bins also take everything below and above. Percentiles read from them are within ~12%
+RTT_BIN_BASE = 0.05
+RTT_BIN_RATIO = 1.25
+RTT_BINS = 64
+
+
+def _rtt_bin(rtt):
+    if rtt <= RTT_BIN_BASE:
+        return 0
+    return min(int(math.log(rtt / RTT_BIN_BASE) / math.log(RTT_BIN_RATIO)), RTT_BINS - 1)
+
+
+class _RttBucket:
+    """Probe outcomes of one host over one interval: counts, min/max and a histogram of RTTs."""
+
+    __slots__ = ("samples", "failures", "rtt_min", "rtt_max", "histogram")
+
+    def __init__(self):
+        self.samples = 0
+        self.failures = 0
+        self.rtt_min = None
+        self.rtt_max = None
+        self.histogram = np.zeros(RTT_BINS, dtype=np.uint32)
+
+    def add(self, rtt):
+        self.samples += 1
+        if rtt is None:
+            self.failures += 1
+            return
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+        self.rtt_max = rtt if self.rtt_max is None else max(self.rtt_max, rtt)
+        self.histogram[_rtt_bin(rtt)] += 1
+
+    def merge(self, other):
+        self.samples += other.samples
+        self.failures += other.failures
+        for bound, pick in (("rtt_min", min), ("rtt_max", max)):
+            a, b = getattr(self, bound), getattr(other, bound)
+            setattr(self, bound, b if a is None else a if b is None else pick(a, b))
+        self.histogram += other.histogram
+
+    @classmethod
+    def from_row(cls, row):
+        bucket = cls()
+        bucket.samples, bucket.failures = row.samples, row.failures
+        bucket.rtt_min, bucket.rtt_max = row.rtt_min, row.rtt_max
+        bucket.histogram = np.frombuffer(row.histogram, dtype="<u4").astype(np.uint32)
+        return bucket
+
+    def row(self, target, target_id, bucket_ms):
+        return {
+            "target": target,
+            "target_id": target_id,
+            "bucket": bucket_ms,
+            "samples": self.samples,
+            "failures": self.failures,
+            "rtt_min": self.rtt_min,
+            "rtt_max": self.rtt_max,
+            "histogram": self.histogram.astype("<u4").tobytes(),
+        }
+
+    def percentiles(self):
+        ok = self.samples - self.failures
+        if ok <= 0:
+            return None
+        cumulative = np.cumsum(self.histogram)
+        out = {}
+        for p in RTT_PERCENTILES:
+            i = int(np.searchsorted(cumulative, p / 100.0 * ok))
+            # Geometric middle of the bin, kept inside the observed range
+            value = RTT_BIN_BASE * RTT_BIN_RATIO ** (min(i, RTT_BINS - 1) + 0.5)
+            out[f"p{p}"] = round(float(min(max(value, self.rtt_min), self.rtt_max)), 3)
+        return out
+
+
+class AvailabilityHistory:
+    """Records probe outcomes as state transitions and per-interval RTT aggregates (both in MySQL).
+
+    Each worker aggregates the probes it ran and writes one row per host once an interval is
+    over; queries sum the rows of every worker, plus this worker's interval still in progress.
+    """
+
+    def __init__(self, flush_interval=HISTORY_FLUSH_INTERVAL, flush_batch=HISTORY_FLUSH_BATCH, rtt_bucket=HISTORY_RTT_BUCKET):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.rtt_bucket = rtt_bucket
+        self._state = {}
+        self._rtt = {}  # (target, target_id, bucket ms) -> _RttBucket not yet written
+        self._pending = []
+        self._lock = threading.Lock()
+        self._task = None
+
+    def _bucket_ms(self, ts):
+        return int(ts // self.rtt_bucket) * self.rtt_bucket * 1000
+
+    def record(self, target, target_id, alive, rtt=None, ts=None):
+        ts = time.time() if ts is None else ts
+        key = (target, target_id)
+        with self._lock:
+            rtt_key = (target, target_id, self._bucket_ms(ts))
+            bucket = self._rtt.get(rtt_key)
+            if bucket is None:
+                bucket = self._rtt[rtt_key] = _RttBucket()
+            bucket.add(float(rtt) if alive and rtt is not None else None)
+            if self._state.get(key) != alive:
+                self._state[key] = alive
+                self._pending.append({
+                    "target": target,
+                    "target_id": target_id,
+                    "ts": int(ts * 1000),
+                    "active": alive,
+                })
+
+    def flush(self, final=False):
+        """Write pending transitions and finished RTT intervals (all of them when `final`)."""
+        current = None if final else self._bucket_ms(time.time())
+        with self._lock:
+            rows, self._pending = self._pending, []
+            done = {k: b for k, b in self._rtt.items() if current is None or k[2] < current}
+            for k in done:
+                del self._rtt[k]
+        if not rows and not done:
+            return 0
+        rtt_rows = [b.row(*k) for k, b in done.items()]
+        db = session()
+        try:
+            for i in range(0, len(rows), self.flush_batch):
+                db.execute(insert(models.AvailabilityTransitions), rows[i:i + self.flush_batch])
+            for i in range(0, len(rtt_rows), self.flush_batch):
+                db.execute(insert(models.AvailabilityRtt), rtt_rows[i:i + self.flush_batch])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"History flush failed, keeping {len(rows)} transitions and {len(done)} RTT intervals for retry: {e}")
+            with self._lock:
+                self._pending[:0] = rows
+                for k, b in done.items():
+                    if k in self._rtt:
+                        b.merge(self._rtt[k])
+                    self._rtt[k] = b
+            return 0
+        finally:
+            db.close()
+        return len(rows) + len(rtt_rows)
+
+    def _transitions(self, target, target_id, start, end):
+        # Rows inside the window plus the last one before it (the state at `start`)
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        T = models.AvailabilityTransitions
+        db = session()
+        try:
+            before = db.execute(
+                select(T.ts, T.active)
+                .where(T.target == target, T.target_id == target_id, T.ts < start_ms)
+                .order_by(T.ts.desc())
+                .limit(1)
+            ).all()
+            inside = db.execute(
+                select(T.ts, T.active)
+                .where(T.target == target, T.target_id == target_id, T.ts >= start_ms, T.ts <= end_ms)
+                .order_by(T.ts)
+            ).all()
+        finally:
+            db.close()
+        with self._lock:
+            pending = [
+                (r["ts"], r["active"]) for r in self._pending
+                if r["target"] == target and r["target_id"] == target_id and r["ts"] <= end_ms
+            ]
+        rows = sorted(before + inside + pending)
+        ts = np.array([r[0] for r in rows], dtype=np.int64) / 1000.0
+        active = np.array([bool(r[1]) for r in rows], dtype=bool)
+        return ts, active
+
+    def uptime(self, target, target_id, start, end):
+        ts, active = self._transitions(target, target_id, start, end)
+        if len(ts) == 0:
+            return {"uptime_percent": None, "observed_seconds": 0.0, "up_seconds": 0.0}
+        # Each transition holds until the next one; time before the first record is unknown
+        edges = np.clip(np.append(ts, end), start, end)
+        durations = np.diff(edges)
+        observed = float(durations.sum())
+        up = float(durations[active].sum())
+        return {
+            "uptime_percent": round(100.0 * up / observed, 3) if observed > 0 else None,
+            "observed_seconds": round(observed, 3),
+            "up_seconds": round(up, 3),
+        }
+
+    def flaps(self, target, target_id, start, end):
+        ts, active = self._transitions(target, target_id, start, end)
+        in_window = ts[1:] >= start
+        changed = active[1:] != active[:-1]
+        downs = changed & ~active[1:]
+        return {
+            "flaps": int((changed & in_window).sum()),
+            "down_events": int((downs & in_window).sum()),
+        }
+
+    def rtt(self, target, target_id, start, end):
+        """Loss and RTT percentiles over the intervals overlapping [start, end]."""
+        first, last = self._bucket_ms(start), int(end * 1000)
+        R = models.AvailabilityRtt
+        db = session()
+        try:
+            rows = db.execute(
+                select(R.samples, R.failures, R.rtt_min, R.rtt_max, R.histogram)
+                .where(R.target == target, R.target_id == target_id, R.bucket >= first, R.bucket <= last)
+            ).all()
+        finally:
+            db.close()
+        total = _RttBucket()
+        for row in rows:
+            total.merge(_RttBucket.from_row(row))
+        with self._lock:
+            for (t, tid, bucket_ms), bucket in self._rtt.items():
+                if t == target and tid == target_id and first <= bucket_ms <= last:
+                    total.merge(bucket)
+        if total.samples == 0:
+            return {"samples": 0, "loss_percent": None, "percentiles": None, "interval_seconds": self.rtt_bucket}
+        return {
+            "samples": total.samples,
+            "loss_percent": round(100.0 * total.failures / total.samples, 3),
+            "percentiles": total.percentiles(),
+            "interval_seconds": self.rtt_bucket,
+        }
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush, True)
+
+
+availability_history = AvailabilityHistory()
@@ -0,0 +1,163 @@
+"""IP address analysis over every inventory table, vectorized with NumPy.
+
+Addresses are parsed straight from the fixed-width bytes of the strings (no per-row
+Python parsing), then duplicates, subnet usage and free ranges are sorts and diffs on
+uint32 arrays.
+"""
+import ipaddress
+
+import numpy as np
+from sqlalchemy import select
+
+import models
+
+# source name -> model; Cabinet has no IP column
+IP_SOURCES = {
+    "devices": models.Devices,
+    "switches": models.Switches,
+    "cameras": models.Cameras,
+    "telephones": models.Telos,
+    "nursing": models.Nursing,
+    "access_points": models.AccessPoints,
+}
+MAX_IP_LEN = 15  # "255.255.255.255"
+
+
+class IpTable:
+    """Parallel arrays of (source, row id, raw text, uint32 address, valid) for every non-empty IP."""
+
+    def __init__(self, sources, ids, raw):
+        self.sources = np.array(sources, dtype=object)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.raw = np.array(raw, dtype=object)
+        self.ip, self.valid = parse_ipv4(raw)
+
+    @classmethod
+    def load(cls, db):
+        sources, ids, raw = [], [], []
+        for name, model in IP_SOURCES.items():
+            for row_id, ip in db.execute(select(model.id, model.IP).where(model.IP.is_not(None), model.IP != "")):
+                sources.append(name)
+                ids.append(row_id)
+                raw.append(ip)
+        return cls(sources, ids, raw)
+
+    def rows(self, mask):
+        return [
+            {"source": s, "id": int(i), "IP": r}
+            for s, i, r in zip(self.sources[mask], self.ids[mask], self.raw[mask])
+        ]
+
+
+def parse_ipv4(values):
+    """Dotted quads -> (uint32 array, valid mask), over all values at once."""
+    n = len(values)
+    if n == 0:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=bool)
+    text = np.char.strip(np.array(values, dtype=str))
+    lengths = np.char.str_len(text)
+    valid = (lengths > 0) & (lengths <= MAX_IP_LEN)
+    # Fixed-width code points (longer strings are already invalid, truncating them is harmless);
+    # anything non-ASCII becomes "?" and fails the character check below
+    cp = text.astype(f"U{MAX_IP_LEN}").view(np.uint32).reshape(n, MAX_IP_LEN)
+    b = np.where(cp < 128, cp, ord("?")).astype(np.uint8)
+
+    is_dot = b == ord(".")
+    is_digit = (b >= ord("0")) & (b <= ord("9"))
+    is_pad = b == 0
+    valid &= (is_dot | is_digit | is_pad).all(axis=1)
+    valid &= is_dot.sum(axis=1) == 3
+
+    # Octets are runs of digits. Each run's value is read at its last character from the
+    # (at most) two digits before it; columns are shifted by padding, no per-row loops
+    dig = np.pad(is_digit, ((0, 0), (3, 1)))
+    d = np.where(dig, np.pad(b, ((0, 0), (3, 1))) - ord("0"), 0).astype(np.int16)
+    c = slice(3, 3 + MAX_IP_LEN)
+    c1, c2, c3 = slice(2, 2 + MAX_IP_LEN), slice(1, 1 + MAX_IP_LEN), slice(0, MAX_IP_LEN)
+    end = dig[:, c] & ~dig[:, 4:4 + MAX_IP_LEN]
+    value = d[:, c] + np.int16(10) * d[:, c1] + np.int16(100) * d[:, c2] * dig[:, c1]
+    valid &= end.sum(axis=1) == 4
+    valid &= ~(end & dig[:, c1] & dig[:, c2] & dig[:, c3]).any(axis=1)  # more than 3 digits
+    valid &= ~(end & (value > 255)).any(axis=1)
+
+    rows, cols = np.nonzero(end & valid[:, None])
+    octets = np.zeros((n, 4), dtype=np.int64)
+    octets[rows, np.cumsum(is_dot, axis=1)[rows, cols]] = value[rows, cols]
+
+    ip = (octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]
+    return np.where(valid, ip, 0).astype(np.uint32), valid
+
+
+def ip_str(value):
+    return str(ipaddress.IPv4Address(int(value)))
+
+
+def duplicates(table):
+    ips = table.ip[table.valid]
+    values, counts = np.unique(ips, return_counts=True)
+    dup = values[counts > 1]
+    if len(dup) == 0:
+        return []
+    mask = table.valid & np.isin(table.ip, dup)
+    order = np.argsort(table.ip[mask], kind="stable")
+    holders = np.array(table.rows(mask), dtype=object)[order]
+    grouped = {}
+    for ip, holder in zip(table.ip[mask][order], holders):
+        grouped.setdefault(ip_str(ip), []).append(holder)
+    return [{"IP": ip, "count": len(h), "holders": h} for ip, h in grouped.items()]
+
+
+def subnet_usage(table, prefix=24):
+    used = np.unique(table.ip[table.valid])
+    if len(used) == 0:
+        return []
+    host_bits = 32 - prefix
+    nets, counts = np.unique(used >> np.uint32(host_bits) if host_bits < 32 else np.zeros_like(used), return_counts=True)
+    size = max(1, 2 ** host_bits - 2) if prefix < 31 else 2 ** host_bits
+    return [
+        {
+            "subnet": f"{ip_str(int(net) << host_bits if host_bits < 32 else 0)}/{prefix}",
+            "used": int(c),
+            "size": size,
+            "utilization_percent": round(100.0 * int(c) / size, 2),
+        }
+        for net, c in zip(nets, counts)
+    ]
+
+
+def free_ranges(table, subnet, limit=20):
+    """Free host ranges (network and broadcast excluded) in `subnet`, plus the first `limit` free addresses."""
+    net = ipaddress.IPv4Network(subnet, strict=False)
+    first, last = int(net.network_address), int(net.broadcast_address)
+    if net.prefixlen < 31:
+        first, last = first + 1, last - 1
+    ips = table.ip[table.valid].astype(np.int64)
+    used = np.unique(ips[(ips >= first) & (ips <= last)])
+    # Gaps between consecutive used addresses, with sentinels just outside the host range
+    bounds = np.concatenate([[first - 1], used, [last + 1]])
+    gaps = np.diff(bounds) > 1
+    starts, ends = bounds[:-1][gaps] + 1, bounds[1:][gaps] - 1
+    ranges = [{"start": ip_str(s), "end": ip_str(e), "size": int(e - s + 1)} for s, e in zip(starts, ends)]
+    suggestions = []
+    for s, e in zip(starts, ends):
+        take = min(int(e - s + 1), limit - len(suggestions))
+        suggestions.extend(ip_str(v) for v in range(int(s), int(s) + take))
+        if len(suggestions) >= limit:
+            break
+    return {
+        "subnet": str(net),
+        "used": int(len(used)),
+        "free": int((ends - starts + 1).sum()),
+        "ranges": ranges,
+        "next_free": suggestions,
+    }
+
+
+def analyze(table, prefix=24):
+    return {
+        "total": int(len(table.ip)),
+        "valid": int(table.valid.sum()),
+        "invalid": table.rows(~table.valid),
+        "duplicates": duplicates(table),
+        "subnets": subnet_usage(table, prefix),
+    }
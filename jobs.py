@@ -0,0 +1,431 @@
+"""Background jobs: a durable local queue (SQLite in WAL mode) drained by a bounded pool per worker.
+
+Handlers are registered by kind and are async functions taking (job, params); they report
+progress through job.progress() and return a JSON-able result. All API workers share the
+same file: claims are atomic, duplicates of a queued or running job collapse into it, and
+running jobs hold a lease so jobs left behind by a dead worker are picked up again.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from leader import leadership
+
+JOBS_PATH = os.getenv("JOBS_PATH", os.path.join(os.path.dirname(__file__), "jobs.db"))
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "4"))  # running jobs per API worker
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+JOBS_LEASE = float(os.getenv("JOBS_LEASE", "60"))  # a running job not heartbeating this long is requeued
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RETENTION = float(os.getenv("JOBS_RETENTION", str(7 * 86400)))
+# Periodic jobs, seconds between runs (0 disables). Discovery rewrites port links, so it is opt-in
+JOBS_PING_SWEEP_INTERVAL = float(os.getenv("JOBS_PING_SWEEP_INTERVAL", "300"))
+JOBS_DISCOVERY_INTERVAL = float(os.getenv("JOBS_DISCOVERY_INTERVAL", "0"))
+JOBS_IP_INGEST_INTERVAL = float(os.getenv("JOBS_IP_INGEST_INTERVAL", "900"))  # only fills empty IPs
+JOBS_BRIDGE_REFRESH_INTERVAL = float(os.getenv("JOBS_BRIDGE_REFRESH_INTERVAL", "300"))  # keep under BRIDGE_MAX_AGE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    source TEXT NOT NULL DEFAULT 'api',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_key ON jobs (dedupe_key) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, id);
+"""
+
+
+class UnknownJobKind(ValueError):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def dedupe_key(kind, params):
+    return kind + ":" + json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+def _row(row):
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    end = job["finished_at"] or (time.time() if job["started_at"] else None)
+    job["duration"] = round(end - job["started_at"], 3) if job["started_at"] else None
+    job["waited"] = round((job["started_at"] or time.time()) - job["created_at"], 3)
+    job["percent"] = round(100.0 * job["done"] / job["total"], 1) if job["total"] else None
+    return job
+
+
+class Job:
+    """Handle passed to a running handler."""
+
+    def __init__(self, queue, job_id, params):
+        self.queue = queue
+        self.id = job_id
+        self.params = params
+        self.cancelled = False
+
+    def progress(self, done, total=None, message=None):
+        self.queue._progress(self.id, done, total, message)
+
+    def check_cancelled(self):
+        # For handlers doing blocking work in threads, where task cancellation can't reach
+        if self.cancelled:
+            raise JobCancelled()
+
+    async def to_thread(self, func, *args):
+        """asyncio.to_thread for blocking handler work, which cancellation can't interrupt.
+
+        When the job is cancelled this still waits for `func` (which should call check_cancelled()
+        before anything it can't undo), so the job is not reported cancelled while its thread is
+        still writing. If `func` finishes anyway, its result stands.
+        """
+        future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            return await future
+
+
+class JobQueue:
+    """Persistent job queue with deduplication, cancellation, leases and periodic schedules."""
+
+    def __init__(self, path=JOBS_PATH, concurrency=JOBS_CONCURRENCY, interval=JOBS_POLL_INTERVAL, lease=JOBS_LEASE):
+        self.path = path
+        self.concurrency = concurrency
+        self.interval = interval
+        self.lease = lease
+        self.worker = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.handlers = {}
+        self.schedules = []  # (interval, callable returning [(kind, params)], next_due)
+        self._running = {}  # job id -> (Job, asyncio.Task)
+        self._wake = None
+        self._loop = None
+        self._task = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._ready = False
+        self._completed = 0
+        self._failed = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._ready = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def schedule(self, interval, jobs):
+        """Enqueue jobs() every `interval` seconds (0 disables); duplicates of active jobs are dropped.
+
+        Only the leader worker enqueues scheduled jobs (see leader.py); any worker may run them.
+        """
+        if interval > 0:
+            self.schedules.append([interval, jobs, 0.0])
+
+    # --- queue operations (sync, callable from any thread) ---
+
+    def enqueue(self, kind, params=None, source="api"):
+        """Returns (job, created). An identical job that is still queued or running is returned instead."""
+        if kind not in self.handlers:
+            raise UnknownJobKind(kind)
+        params = params or {}
+        key = dedupe_key(kind, params)
+        conn = self._connect()
+        try:
+            try:
+                cur = conn.execute(
+                    "INSERT INTO jobs (kind, params, dedupe_key, source, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (kind, json.dumps(params), key, source, time.time()),
+                )
+                job, created = conn.execute("SELECT * FROM jobs WHERE id = ?", (cur.lastrowid,)).fetchone(), True
+            except sqlite3.IntegrityError:
+                job, created = conn.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')", (key,)
+                ).fetchone(), False
+        finally:
+            conn.close()
+        if created and self._wake is not None:
+            self._wake_soon()
+        if job is None:  # finished between the failed insert and the read; try again
+            return self.enqueue(kind, params, source)
+        return _row(job), created
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return _row(row) if row else None
+
+    def list(self, status=None, kind=None, limit=100):
+        where, args = [], []
+        if status:
+            where.append("status = ?")
+            args.append(status)
+        if kind:
+            where.append("kind = ?")
+            args.append(kind)
+        sql = "SELECT * FROM jobs" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id DESC LIMIT ?"
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, args + [limit]).fetchall()
+        finally:
+            conn.close()
+        return [_row(r) for r in rows]
+
+    def cancel(self, job_id):
+        """Queued jobs are cancelled at once; running ones are flagged and stopped by their worker."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, cancel_requested = 1 WHERE id = ? AND status = 'queued'",
+                (now, job_id),
+            )
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        finally:
+            conn.close()
+        self._cancel_local(job_id)
+        return self.get(job_id)
+
+    def _cancel_local(self, job_id):
+        with self._lock:
+            running = self._running.get(job_id)
+        if running:
+            job, task = running
+            job.cancelled = True
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def _claim(self, limit):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same row
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Leases that ran out belong to a worker that died; give the job another go (or fail it)
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " error = 'worker lost', worker = NULL,"
+                " finished_at = CASE WHEN attempts >= ? THEN ? ELSE NULL END"
+                " WHERE status = 'running' AND heartbeat_at < ?",
+                (JOBS_MAX_ATTEMPTS, JOBS_MAX_ATTEMPTS, now, now - self.lease),
+            )
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                " started_at = ?, heartbeat_at = ? WHERE id = ?",
+                [(self.worker, now, now, r["id"]) for r in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return rows
+
+    def _progress(self, job_id, done, total, message):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET done = ?, total = COALESCE(?, total), message = COALESCE(?, message),"
+                " heartbeat_at = ? WHERE id = ?",
+                (done, total, message, time.time(), job_id),
+            )
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND worker = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, self.worker),
+            )
+        finally:
+            conn.close()
+
+    def _heartbeat(self):
+        """Renew leases on our running jobs and pick up cancellations requested through other workers."""
+        with self._lock:
+            ids = list(self._running)
+        if not ids:
+            return
+        conn = self._connect()
+        try:
+            marks = ",".join("?" * len(ids))
+            conn.execute(f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({marks})", [time.time()] + ids)
+            cancelled = [r[0] for r in conn.execute(f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({marks})", ids)]
+        finally:
+            conn.close()
+        for job_id in cancelled:
+            self._cancel_local(job_id)
+
+    def prune(self, older_than=JOBS_RETENTION):
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?",
+                (time.time() - older_than,),
+            ).rowcount
+        finally:
+            conn.close()
+
+    # --- worker (one per API process) ---
+
+    def _wake_soon(self):
+        # enqueue() runs in request threads; the event belongs to the worker's loop
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _execute(self, row):
+        job = Job(self, row["id"], json.loads(row["params"]))
+        with self._lock:
+            self._running[job.id] = (job, asyncio.current_task())
+        try:
+            result = await self.handlers[row["kind"]](job, job.params)
+        except (asyncio.CancelledError, JobCancelled):
+            if self._stopping and not job.cancelled:
+                # Shutting down: hand the job back to the queue for the next worker
+                await asyncio.to_thread(self._requeue, job.id)
+            else:
+                await asyncio.to_thread(self._finish, job.id, "cancelled")
+        except Exception as e:
+            print(f"Job {job.id} ({row['kind']}) failed: {e}")
+            self._failed += 1
+            await asyncio.to_thread(self._finish, job.id, "failed", None, str(e)[:500])
+        else:
+            self._completed += 1
+            await asyncio.to_thread(self._finish, job.id, "succeeded", result)
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+            self._wake.set()
+
+    def _due_schedules(self, now):
+        due = []
+        for entry in self.schedules:
+            interval, jobs, next_due = entry
+            if next_due <= now:
+                entry[2] = now + interval
+                due.append(jobs)
+        return due
+
+    def _enqueue_scheduled(self, due):
+        for jobs in due:
+            for kind, params in jobs():
+                self.enqueue(kind, params, source="schedule")
+
+    async def run(self):
+        last_heartbeat = last_prune = 0.0
+        while True:
+            try:
+                now = time.time()
+                due = self._due_schedules(now) if leadership.is_leader else []
+                if due:
+                    await asyncio.to_thread(self._enqueue_scheduled, due)
+                if now - last_heartbeat >= min(self.lease / 4, 5):
+                    await asyncio.to_thread(self._heartbeat)
+                    last_heartbeat = now
+                if now - last_prune >= 3600:
+                    await asyncio.to_thread(self.prune)
+                    last_prune = now
+                free = self.concurrency - len(self._running)
+                if free > 0:
+                    for row in await asyncio.to_thread(self._claim, free):
+                        asyncio.get_running_loop().create_task(self._execute(row))
+            except Exception as e:
+                print(f"Job worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._stopping = False
+            self._task = self._loop.create_task(self.run())
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Running jobs go back to the queue instead of being lost (see _execute)
+        with self._lock:
+            tasks = [task for _, task in self._running.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _requeue(self, job_id):
+        # Stays an active status throughout, so it can't collide with a duplicate; the attempt doesn't count
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL, attempts = attempts - 1"
+                " WHERE id = ? AND worker = ?",
+                (job_id, self.worker),
+            )
+        finally:
+            conn.close()
+
+    def metrics(self):
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            "worker": self.worker,
+            "concurrency": self.concurrency,
+            "schedules_here": leadership.is_leader,
+            "running_here": len(self._running),
+            "completed_here": self._completed,
+            "failed_here": self._failed,
+            "by_status": counts,
+            "oldest_queued_age": round(time.time() - oldest, 1) if oldest else None,
+            "kinds": sorted(self.handlers),
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,75 @@
+"""Pick one API worker per host to run the host-wide background tasks.
+
+serve.py starts several uvicorn workers and every one of them runs the app's lifespan. Tasks
+that only handle their own worker's state are safe to run in each:
+
+- job queue workers: claims are atomic (jobs.py)
+- the complaint outbox: rows are claimed with a lease (complaints/outbox.py)
+- the status writer and availability history: each flushes what its own worker observed
+- the complaint notifier: sends what its own worker queued
+
+The rest act for the whole host and check `leadership.is_leader` first:
+
+- the PoE poller: the leader polls and publishes, the others serve the published snapshot (poe.py)
+- periodic topology snapshots (snapshots.py)
+- periodic job schedules (jobs.py), which include refreshing the shared bridge host table
+
+The leader is whichever worker holds an flock on LEADER_LOCK_PATH (its pid is written there).
+The lock goes away with the process, and another worker takes over within LEADER_RETRY seconds.
+"""
+import asyncio
+import fcntl
+import os
+
+LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", os.path.join(os.path.dirname(__file__), "leader.lock"))
+LEADER_RETRY = float(os.getenv("LEADER_RETRY", "5"))
+
+
+class Leadership:
+    def __init__(self, path=LEADER_LOCK_PATH, retry=LEADER_RETRY):
+        self.path = path
+        self.retry = retry
+        self.is_leader = False
+        self._fd = None
+        self._task = None
+
+    def try_acquire(self):
+        if self.is_leader:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        self.is_leader = True
+        print(f"Worker {os.getpid()} runs the host-wide background tasks")
+        return True
+
+    async def run(self):
+        while not self.try_acquire():
+            await asyncio.sleep(self.retry)
+
+    def start(self):
+        # Tried right away so the leader's tasks see is_leader on their first iteration
+        if not self.try_acquire() and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._fd is not None:
+            os.close(self._fd)  # releases the flock
+            self._fd = None
+        self.is_leader = False
+
+
+leadership = Leadership()
@@ -0,0 +1,204 @@
+"""Fill in device IPs from the routers' ARP tables and DHCP leases.
+
+Every router's /ip/arp and /ip/dhcp-server/lease are read concurrently (only the columns
+used here), parsed as whole columns (macs.parse_macs, ipam.parse_ipv4) and joined to the
+devices through a dict keyed by the 48-bit MAC. All updates go out in one transaction.
+"""
+import asyncio
+import os
+
+import numpy as np
+from sqlalchemy import bindparam, or_, select, update
+
+import models
+from db import session
+from ipam import IpTable, parse_ipv4, ip_str
+from macs import parse_macs, format_macs
+from routeros_session import router_sessions
+
+LEASE_ROUTERS = [h.strip() for h in os.getenv("LEASE_ROUTERS", "192.168.88.1").split(",") if h.strip()]
+LEASE_CONCURRENCY = int(os.getenv("LEASE_CONCURRENCY", "8"))
+
+# Where an address came from, best first: a bound lease is what the device was actually given
+BOUND_LEASE, ARP, OTHER_LEASE = 0, 1, 2
+SOURCE_NAMES = {BOUND_LEASE: "dhcp", ARP: "arp", OTHER_LEASE: "dhcp (not bound)"}
+
+TABLES = {
+    "/ip/arp": "address,mac-address,complete,invalid,disabled",
+    "/ip/dhcp-server/lease": "address,active-address,mac-address,active-mac-address,status,disabled",
+}
+
+
+def read_table(host, path):
+    with router_sessions.api(host) as api:
+        return api.get_resource(path).call("print", {".proplist": TABLES[path]})
+
+
+def _entries(path, rows):
+    # -> (ip, mac, rank) triples; entries a router marks invalid, incomplete or disabled are skipped
+    for r in rows:
+        if r.get("disabled") == "true" or r.get("invalid") == "true":
+            continue
+        if path == "/ip/arp":
+            if r.get("complete") == "false":
+                continue
+            yield r.get("address"), r.get("mac-address"), ARP
+        else:
+            bound = r.get("status") == "bound"
+            yield (
+                r.get("active-address") or r.get("address"),
+                r.get("active-mac-address") or r.get("mac-address"),
+                BOUND_LEASE if bound else OTHER_LEASE,
+            )
+
+
+async def collect(routers=None, concurrency=LEASE_CONCURRENCY):
+    """Read every (router, table) pair concurrently. Returns (entries, per-router errors)."""
+    routers = LEASE_ROUTERS if routers is None else routers
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(host, path):
+        async with semaphore:
+            return await asyncio.to_thread(read_table, host, path)
+
+    pairs = [(h, p) for h in routers for p in TABLES]
+    results = await asyncio.gather(*(one(h, p) for h, p in pairs), return_exceptions=True)
+    entries, errors = [], {}
+    for (host, path), rows in zip(pairs, results):
+        if isinstance(rows, Exception):
+            print(f"Lease ingest: reading {path} from {host} failed: {rows}")
+            errors.setdefault(host, {})[path] = str(rows)
+            continue
+        entries.extend(_entries(path, rows))
+    return entries, errors
+
+
+def best_addresses(entries):
+    """One IP per MAC, from the best-ranked source. MACs seen with different IPs at that rank are ambiguous.
+
+    Returns (macs, ips, ranks, ambiguous_macs) as arrays.
+    """
+    if not entries:
+        empty = np.empty(0, dtype=np.uint64)
+        return empty, np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int8), empty
+    ips_raw, macs_raw, ranks = zip(*entries)
+    macs, mac_ok = parse_macs(macs_raw)
+    ips, ip_ok = parse_ipv4(["" if v is None else v for v in ips_raw])
+    ranks = np.array(ranks, dtype=np.int8)
+    ok = mac_ok & ip_ok & (macs != 0) & (ips != 0)
+    macs, ips, ranks = macs[ok], ips[ok], ranks[ok]
+
+    # Sort by (mac, rank, ip), then keep each MAC's best rank only
+    order = np.lexsort((ips, ranks, macs))
+    macs, ips, ranks = macs[order], ips[order], ranks[order]
+    first = np.ones(len(macs), dtype=bool)
+    first[1:] = macs[1:] != macs[:-1]
+    best_rank = ranks[first][np.cumsum(first) - 1]
+    keep = ranks == best_rank
+    macs, ips, ranks = macs[keep], ips[keep], ranks[keep]
+
+    # Several routers reporting the same (mac, ip) is fine; different IPs at the same rank is not
+    distinct = np.ones(len(macs), dtype=bool)
+    distinct[1:] = (macs[1:] != macs[:-1]) | (ips[1:] != ips[:-1])
+    macs, ips, ranks = macs[distinct], ips[distinct], ranks[distinct]
+    uniq, counts = np.unique(macs, return_counts=True)
+    ambiguous = uniq[counts > 1]
+    single = ~np.isin(macs, ambiguous)
+    return macs[single], ips[single], ranks[single], ambiguous
+
+
+def plan(db, entries, overwrite=False):
+    """Match router addresses to devices. Nothing is written; see apply()."""
+    macs, ips, ranks, ambiguous = best_addresses(entries)
+    found = dict(zip(macs.tolist(), zip(ips.tolist(), ranks.tolist())))
+
+    D = models.Devices
+    devices = db.execute(select(D.id, D.name, D.Mac, D.IP).where(D.Mac.is_not(None), D.Mac != "")).all()
+    dev_macs, dev_ok = parse_macs([d.Mac for d in devices])
+
+    # Hash index MAC -> device; a MAC recorded on several devices can't say which one to update
+    index, shared = {}, set()
+    for mac, ok, d in zip(dev_macs.tolist(), dev_ok, devices):
+        if not ok:
+            continue
+        if mac in index:
+            shared.add(mac)
+        index[mac] = d
+    # Addresses already held anywhere in the inventory; giving them to a device would create a conflict
+    table = IpTable.load(db)
+    holders = {
+        ip: (source, row_id)
+        for ip, source, row_id in zip(table.ip[table.valid].tolist(), table.sources[table.valid], table.ids[table.valid].tolist())
+    }
+
+    updates, conflicts, unchanged = [], [], 0
+    for mac, (ip, rank) in found.items():
+        d = index.get(mac)
+        if d is None or mac in shared:
+            continue
+        has_ip = bool((d.IP or "").strip())
+        if has_ip and not overwrite:
+            continue
+        holder = holders.get(ip)
+        if holder == ("devices", d.id):
+            unchanged += 1
+            continue
+        if holder is not None:
+            conflicts.append({"device_id": d.id, "name": d.name, "IP": ip_str(ip), "held_by": {"source": holder[0], "id": holder[1]}})
+            continue
+        updates.append({
+            "device_id": d.id,
+            "name": d.name,
+            "Mac": d.Mac,
+            "old_IP": d.IP,
+            "IP": ip_str(ip),
+            "source": SOURCE_NAMES[rank],
+        })
+        holders[ip] = ("devices", d.id)
+    return {
+        "entries": len(entries),
+        "macs_with_address": len(found),
+        "matched_devices": sum(1 for m in found if m in index and m not in shared),
+        "unchanged": unchanged,
+        "updates": updates,
+        "conflicts": conflicts,
+        "ambiguous_macs": [str(m) for m in format_macs(ambiguous)],
+        "shared_device_macs": [str(m) for m in format_macs(np.array(sorted(shared), dtype=np.uint64))],
+    }
+
+
+def apply(db, updates, overwrite=False):
+    """Write planned IPs in one transaction (an executemany UPDATE). Returns the number of rows changed.
+
+    Without overwrite a device that got an IP meanwhile is left alone.
+    """
+    if not updates:
+        return 0
+    D = models.Devices
+    stmt = update(D).where(D.id == bindparam("b_id")).values(IP=bindparam("b_ip"))
+    if not overwrite:
+        stmt = stmt.where(or_(D.IP.is_(None), D.IP == ""))
+    result = db.connection().execute(stmt, [{"b_id": u["device_id"], "b_ip": u["IP"]} for u in updates])
+    db.commit()
+    return result.rowcount
+
+
+async def ingest(routers=None, overwrite=False, dry_run=False):
+    entries, errors = await collect(routers)
+
+    def run():
+        db = session()
+        try:
+            result = plan(db, entries, overwrite)
+            result["written"] = 0 if dry_run else apply(db, result["updates"], overwrite)
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    result = await asyncio.to_thread(run)
+    result["router_errors"] = errors
+    result["dry_run"] = dry_run
+    return result
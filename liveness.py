@@ -0,0 +1,228 @@
+import asyncio
+import fcntl
+import json
+import os
+import tempfile
+import time
+
+from icmplib import async_ping
+
+from probes import PING_COUNT
+
+
+LIVENESS_RATE = float(os.getenv("LIVENESS_RATE", "200"))  # network checks per second, all hosts together
+LIVENESS_BURST = int(os.getenv("LIVENESS_BURST", "50"))
+LIVENESS_CONCURRENCY = int(os.getenv("LIVENESS_CONCURRENCY", "256"))
+BRIDGE_MAX_AGE = float(os.getenv("BRIDGE_MAX_AGE", "900"))
+BRIDGE_TABLE_PATH = os.getenv("BRIDGE_TABLE_PATH", os.path.join(os.path.dirname(__file__), "bridge_table.json"))
+BRIDGE_REFRESH_CONCURRENCY = int(os.getenv("BRIDGE_REFRESH_CONCURRENCY", "8"))  # switches read at once
+BRIDGE_RELOAD_INTERVAL = 1.0  # seconds between checks of the shared file for other workers' updates
+
+# Checks per device type, tried in order until one succeeds. Override with LIVENESS_POLICIES (JSON).
+DEFAULT_POLICIES = {
+    "CAMERA": ["icmp", "tcp:554", "tcp:80", "bridge"],
+    "PHONE": ["icmp", "tcp:80", "bridge"],
+    "TELEPHONE": ["icmp", "tcp:80", "bridge"],
+    "NURSING": ["icmp", "bridge"],
+    "SWITCH": ["icmp", "tcp:8728"],
+    "DEFAULT": ["icmp"],
+}
+
+
+class CheckResult:
+    def __init__(self, alive, rtt=None, method=None):
+        self.alive = alive
+        self.rtt = rtt
+        self.method = method
+        self.tried = ()  # names of every check run for this result, in order
+
+
+class IcmpCheck:
+    name = "icmp"
+    network = True
+
+    async def __call__(self, engine, ip, mac, timeout):
+        host = await async_ping(ip, count=PING_COUNT, timeout=timeout, privileged=False)
+        return CheckResult(host.is_alive, host.avg_rtt if host.is_alive else None, self.name)
+
+
+class TcpCheck:
+    network = True
+
+    def __init__(self, port):
+        self.port = port
+        self.name = f"tcp:{port}"
+
+    async def __call__(self, engine, ip, mac, timeout):
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port), timeout)
+        except ConnectionRefusedError:
+            # A RST still proves the host is up, just not listening on this port
+            return CheckResult(True, (time.perf_counter() - started) * 1000, self.name)
+        except (OSError, asyncio.TimeoutError):
+            return CheckResult(False, None, self.name)
+        rtt = (time.perf_counter() - started) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return CheckResult(True, rtt, self.name)
+
+
+class BridgeHostCheck:
+    name = "bridge"
+    network = False
+
+    async def __call__(self, engine, ip, mac, timeout):
+        return CheckResult(engine.bridge_table.seen(mac), None, self.name)
+
+
+def parse_check(spec):
+    if spec == "icmp":
+        return IcmpCheck()
+    if spec == "bridge":
+        return BridgeHostCheck()
+    if spec.startswith("tcp:") and spec[4:].isdigit():
+        return TcpCheck(int(spec[4:]))
+    raise ValueError(f"Unknown liveness check: {spec}")
+
+
+class BridgeTable:
+    """MACs seen in MikroTik /interface/bridge/host tables, keyed by normalized MAC.
+
+    Shared by every worker on the host and kept across restarts in BRIDGE_TABLE_PATH:
+    update() merges into the file under an flock, seen() reloads it when another worker wrote it.
+    """
+
+    def __init__(self, max_age=BRIDGE_MAX_AGE, path=BRIDGE_TABLE_PATH):
+        self.max_age = max_age
+        self.path = path
+        self._seen = {}
+        self._loaded_mtime = None
+        self._checked = 0.0
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._loaded_mtime:
+                return
+            with open(self.path) as f:
+                self._seen = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._loaded_mtime = mtime
+
+    def _refresh(self):
+        if time.monotonic() - self._checked >= BRIDGE_RELOAD_INTERVAL:
+            self._checked = time.monotonic()
+            self._load()
+
+    def update(self, switch_id, macs, now=None):
+        now = time.time() if now is None else now
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._load()
+            # Entries too old to count are dropped on the way, so the file doesn't grow forever
+            seen = {mac: e for mac, e in self._seen.items() if now - e[2] <= self.max_age}
+            for mac, port in macs:
+                if mac:
+                    seen[mac] = [switch_id, port, now]
+            tmp_fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".")
+            with os.fdopen(tmp_fd, "w") as f:
+                json.dump(seen, f)
+            os.replace(tmp, self.path)
+            self._seen = seen
+            self._loaded_mtime = os.stat(self.path).st_mtime
+        finally:
+            os.close(fd)  # releases the flock
+
+    def seen(self, mac):
+        self._refresh()
+        entry = self._seen.get(mac) if mac else None
+        return entry is not None and time.time() - entry[2] <= self.max_age
+
+    def __len__(self):
+        self._refresh()
+        return len(self._seen)
+
+
+class _RateLimiter:
+    # Token bucket shared by every network check in the event loop
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LivenessEngine:
+    """Runs per-type liveness policies concurrently under one global rate limit."""
+
+    def __init__(self, policies=None, rate=LIVENESS_RATE, burst=LIVENESS_BURST, concurrency=LIVENESS_CONCURRENCY):
+        raw = dict(DEFAULT_POLICIES)
+        raw.update(policies if policies is not None else json.loads(os.getenv("LIVENESS_POLICIES", "{}")))
+        self.policies = {k.upper(): [parse_check(c) for c in v] for k, v in raw.items()}
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.bridge_table = BridgeTable()
+        self._bridge_check = BridgeHostCheck()
+        self._limiter = None
+        self._semaphore = None
+        self._loop = None
+
+    def policy_for(self, device_type):
+        key = (device_type or "").strip().upper()
+        return self.policies.get(key) or self.policies["DEFAULT"]
+
+    def _bind_loop(self):
+        # The limiter and semaphore belong to whichever event loop is running the checks
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._limiter = _RateLimiter(self.rate, self.burst)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def check(self, ip, mac=None, device_type=None, timeout=0.5):
+        self._bind_loop()
+        result = CheckResult(False)
+        checks = self.policy_for(device_type)
+        if not ip:
+            # Without an address only the bridge host tables can tell, whatever the type's policy
+            checks = [c for c in checks if not c.network] or [self._bridge_check]
+        tried = []
+        for check in checks:
+            tried.append(check.name)
+            try:
+                if check.network:
+                    await self._limiter.acquire()
+                    async with self._semaphore:
+                        result = await check(self, ip, mac, timeout)
+                else:
+                    result = await check(self, ip, mac, timeout)
+            except Exception:
+                result = CheckResult(False, None, check.name)
+            if result.alive:
+                break
+        result.tried = tuple(tried)
+        return result
+
+    async def check_many(self, items):
+        # items: [(ip, mac, device_type, timeout)]
+        return await asyncio.gather(*(self.check(*item) for item in items))
+
+
+liveness_engine = LivenessEngine()
@@ -0,0 +1,127 @@
+"""Compare the dev launcher (main.py: reload + debug log) with serve.py under the same load.
+
+    python loadtest.py --path /stats/floors --concurrency 64 --duration 20
+
+The default path reads the database (through the shared cache); /devices is the heavier
+read, /poe only serves the poller's snapshot from memory. Offline, against a SQLite file:
+
+    DATABASE_URL=sqlite:///loadtest.db SKIP_SCHEMA_SYNC=1 COMPLAINTS_ENABLED=0 python loadtest.py
+
+With a SQLite DATABASE_URL the schema is created here and, when the file has no devices,
+--seed of them are added (without IPs, so requests don't ping anything); the servers skip
+their own schema sync and share the file.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+MODES = {
+    # Same settings as main.py's __main__ block
+    "dev": [sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--reload", "--log-level", "debug"],
+    "prod": [sys.executable, "serve.py"],
+}
+
+
+async def wait_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1)
+                return True
+            except httpx.HTTPError:
+                await asyncio.sleep(0.5)
+    return False
+
+
+async def hammer(url, concurrency, duration):
+    latencies = []
+    errors = 0
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client):
+        nonlocal errors
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                r = await client.get(url)
+                if r.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float("nan")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50_ms": pick(0.50),
+        "p99_ms": pick(0.99),
+    }
+
+
+def prepare_sqlite(seed):
+    from db import is_sqlite, session, sync_schema, URL_DATABASE
+    if not is_sqlite(URL_DATABASE):
+        return
+    import models
+    sync_schema()
+    db = session()
+    try:
+        if db.query(models.Devices).count() == 0:
+            db.add_all([
+                models.Devices(name=f"load-{i}", type="LOADTEST", model="-", floor=i % 10, place="-", show=True, active=False)
+                for i in range(seed)
+            ])
+            db.commit()
+    finally:
+        db.close()
+
+
+def run_mode(mode, args):
+    cmd = MODES[mode] + ["--port", str(args.port)]
+    if mode == "prod":
+        cmd += ["--workers", str(args.workers)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    try:
+        if not asyncio.run(wait_ready(url)):
+            raise RuntimeError(f"{mode} server did not come up on port {args.port}")
+        asyncio.run(hammer(url, args.concurrency, 2))  # warm-up
+        return asyncio.run(hammer(url, args.concurrency, args.duration))
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default="/stats/floors")
+    parser.add_argument("--port", type=int, default=3666)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=["dev", "prod"], choices=list(MODES))
+    parser.add_argument("--seed", type=int, default=2000, help="devices to add to an empty SQLite database")
+    args = parser.parse_args()
+
+    prepare_sqlite(args.seed)
+
+    results = {mode: run_mode(mode, args) for mode in args.modes}
+    print(f"{'mode':<6}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<6}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
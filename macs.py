@@ -0,0 +1,114 @@
+"""Batch MAC handling: whole columns parsed to 48-bit integers, vendor lookup by OUI.
+
+Accepts AA:BB:CC:DD:EE:FF, AA-BB-CC-DD-EE-FF, AABB.CCDD.EEFF and bare hex, any case.
+Parsing works on fixed-width code point arrays, so there is no per-MAC Python.
+
+The bundled oui.csv covers the vendors found on this network; point OUI_FILE at a full
+IEEE export (oui.csv with an "Assignment" column) for everything else.
+"""
+import csv
+import os
+
+import numpy as np
+
+OUI_FILE = os.getenv("OUI_FILE", os.path.join(os.path.dirname(__file__), "oui.csv"))
+MAX_MAC_LEN = 17  # "AA:BB:CC:DD:EE:FF"
+HEX = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+
+# ASCII code -> hex digit value, 255 for anything else
+NIBBLE = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate("0123456789abcdef"):
+    NIBBLE[ord(_c)] = NIBBLE[ord(_c.upper())] = _i
+
+# Flags returned by classify()
+MALFORMED, MULTICAST, LOCAL, ZERO = 1, 2, 4, 8
+
+
+def parse_macs(values):
+    """MAC strings -> (uint64 array, valid mask). None/blank and malformed values are invalid (0)."""
+    n = len(values)
+    if n == 0:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=bool)
+    text = np.char.strip(np.array(["" if v is None else v for v in values], dtype=str))
+    lengths = np.char.str_len(text)
+    valid = (lengths >= 12) & (lengths <= MAX_MAC_LEN)
+    cp = text.astype(f"U{MAX_MAC_LEN}").view(np.uint32).reshape(n, MAX_MAC_LEN)
+    nib = NIBBLE[np.minimum(cp, 255)]  # anything outside ASCII maps to "not hex" (and is not a separator)
+    b = np.where(cp < 128, cp, 0).astype(np.uint8)
+
+    is_hex = nib < 16
+    is_sep = (b == ord(":")) | (b == ord("-")) | (b == ord(".")) | (b == ord(" "))
+    is_pad = cp == 0
+    valid &= (is_hex | is_sep | is_pad).all(axis=1)
+    valid &= is_hex.sum(axis=1) == 12
+
+    # Each hex digit is shifted by 4 bits per hex digit still to come in its row
+    remaining = 12 - np.cumsum(is_hex, axis=1, dtype=np.int8)
+    shift = (np.where(is_hex, np.maximum(remaining, 0), 0) * 4).astype(np.uint64)
+    mac = (np.where(is_hex, nib, 0).astype(np.uint64) << shift).sum(axis=1, dtype=np.uint64)
+    mac[~valid] = 0
+    return mac, valid
+
+
+def format_macs(macs):
+    """48-bit integers -> "AA:BB:CC:DD:EE:FF" strings, vectorized."""
+    macs = np.asarray(macs, dtype=np.uint64)
+    n = len(macs)
+    nibbles = (macs[:, None] >> np.arange(44, -1, -4, dtype=np.uint64)) & np.uint64(0xF)
+    out = np.full((n, MAX_MAC_LEN), ord(":"), dtype=np.uint32)
+    hex_cols = [i for i in range(MAX_MAC_LEN) if i % 3 != 2]
+    out[:, hex_cols] = HEX[nibbles.astype(np.intp)]
+    return out.view(f"U{MAX_MAC_LEN}").reshape(n)
+
+
+def oui_of(prefixes):
+    """Prefixes like "AA:BB:CC" -> uint32 OUIs."""
+    ouis, ok = parse_macs([p.strip() + ":00:00:00" for p in prefixes])
+    return (ouis[ok] >> np.uint64(24)).astype(np.uint32)
+
+
+class OuiTable:
+    """Sorted OUI array with parallel vendor names; lookups are one searchsorted per batch."""
+
+    def __init__(self, path=OUI_FILE):
+        self.path = path
+        self._ouis = None
+        self._vendors = None
+
+    def _load(self):
+        rows = []
+        if self.path and os.path.exists(self.path):
+            with open(self.path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if "Assignment" in row:  # IEEE export: 6 hex digits, no separators
+                        prefix, vendor = row["Assignment"], row["Organization Name"]
+                    else:
+                        prefix, vendor = row["prefix"], row["vendor"]
+                    rows.append((prefix.replace(":", "").replace("-", "").upper(), vendor.strip()))
+        rows = [(int(p, 16), v) for p, v in rows if len(p) == 6]
+        rows.sort()
+        self._ouis = np.array([p for p, _ in rows], dtype=np.uint32)
+        self._vendors = np.array([v for _, v in rows] + [None], dtype=object)  # last slot: unknown
+
+    def vendors(self, macs):
+        """Vendor name (or None) for each 48-bit MAC."""
+        if self._ouis is None:
+            self._load()
+        ouis = (np.asarray(macs, dtype=np.uint64) >> np.uint64(24)).astype(np.uint32)
+        idx = np.searchsorted(self._ouis, ouis)
+        idx_clipped = np.minimum(idx, max(len(self._ouis) - 1, 0))
+        found = (idx < len(self._ouis)) & (self._ouis[idx_clipped] == ouis) if len(self._ouis) else np.zeros(len(ouis), bool)
+        return self._vendors[np.where(found, idx_clipped, len(self._vendors) - 1)]
+
+
+def classify(macs, valid):
+    """Bit flags per MAC: MALFORMED, MULTICAST (I/G bit), LOCAL (U/L bit), ZERO."""
+    first = (macs >> np.uint64(40)).astype(np.uint8)
+    flags = np.where(valid, 0, MALFORMED)
+    flags |= np.where(valid & (first & 1 == 1), MULTICAST, 0)
+    flags |= np.where(valid & (first & 2 == 2), LOCAL, 0)
+    flags |= np.where(valid & (macs == 0), ZERO, 0)
+    return flags
+
+
+oui_table = OuiTable()
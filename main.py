@@ -1,27 +1,84 @@
 from collections import defaultdict
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from typing_extensions import Annotated
 from typing import Optional, List
 import models
-from db import engine, session
+from db import session, read_session, is_replica, mark_write, sync_schema, SKIP_SCHEMA_SYNC, READ_YOUR_WRITES_WINDOW
+import db as database
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.exc import IntegrityError
-import uvicorn
+from sqlalchemy.orm.exc import StaleDataError
 from starlette.middleware.cors import CORSMiddleware
 from passlib.context import CryptContext
-from datetime import datetime
+from datetime import datetime, timedelta
 from secret import SECRET_KEY, ALGO
 import asyncio
-from icmplib import async_ping
-from routeros_api import RouterOsApiPool
+import hashlib
+import ipaddress
+import json
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from poe import poe_cache
+from routeros_session import router_sessions, CircuitOpenError
+from history import availability_history
+from probes import probe_scheduler
+from liveness import liveness_engine, BRIDGE_REFRESH_CONCURRENCY
+from cache import INVENTORY_NAMESPACES, inventory_cache
+from fastapi.responses import JSONResponse, StreamingResponse
+import export
+from snapshots import topology_snapshots
+from status_writer import status_writer
+from rollups import build_rollup
+import ipam
+import numpy as np
+from macs import parse_macs, format_macs, oui_of, classify, oui_table, MALFORMED, MULTICAST, LOCAL, ZERO
+from leader import leadership
+from jobs import job_queue, JOBS_PING_SWEEP_INTERVAL, JOBS_DISCOVERY_INTERVAL, JOBS_IP_INGEST_INTERVAL, JOBS_BRIDGE_REFRESH_INTERVAL
+import leases
+from port_links import link_switch_port, link_patch_panel_port, apply_links, PortConflict, PortNotFound, UNCHANGED
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Everything that touches MySQL or the routers happens here, not at import time
+    if not SKIP_SCHEMA_SYNC:
+        await asyncio.to_thread(sync_schema)
+    # Host-wide tasks (PoE polling, periodic snapshots, job schedules) only run in the leader worker
+    leadership.start()
+    poe_cache.start()
+    availability_history.start()
+    if COMPLAINTS_ENABLED:
+        complaints_outbox.start()  # delivers anything left pending by a previous run
+    topology_snapshots.start()
+    status_writer.start()
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    await poe_cache.stop()
+    await availability_history.stop()
+    await topology_snapshots.stop()
+    await status_writer.stop()
+    if COMPLAINTS_ENABLED:
+        await asyncio.to_thread(complaints_outbox.stop)
+        await asyncio.to_thread(complaints_notifier.stop)
+    await leadership.stop()
+    router_sessions.close_all()
+
+app = FastAPI(lifespan=lifespan)
 
 # Complaints router (Planka integration)
 from complaints.main import router as complaints_router
-app.include_router(complaints_router, prefix="/complaints", tags=["complaints"])
+from complaints.notify import notifier as complaints_notifier
+from complaints.outbox import outbox as complaints_outbox
+# COMPLAINTS_ENABLED=0 runs without Planka's Postgres (edge copies on SQLite, offline tests)
+COMPLAINTS_ENABLED = os.getenv("COMPLAINTS_ENABLED", "1") == "1"
+if COMPLAINTS_ENABLED:
+    app.include_router(complaints_router, prefix="/complaints", tags=["complaints"])
 
 SECRET_KEY = SECRET_KEY
 ALGORITHM = ALGO
@@ -29,8 +86,6 @@ ACCESS_TOKEN_EXPIRE_DAYS = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-models.Base.metadata.create_all(bind=engine)
-
 class DeviceBase(BaseModel):
     type: str
     name: str
@@ -126,25 +181,142 @@ class PortBase(BaseModel):
     occupied: bool
     device_id: int
 
+class PortLinkChange(BaseModel):
+    # Exactly one of switch_id / patch_panel_id; a None target unlinks the port
+    switch_id: Optional[int] = None
+    patch_panel_id: Optional[int] = None
+    port_number: int
+    device_id: Optional[int] = None
+    switch_port_id: Optional[int] = None
+    expected_version: Optional[int] = None
+
 class PortUpdate(BaseModel):
     number: Optional[int] = None
     type: Optional[str] = None
     device_id: Optional[int] = None
 
 
-def get_db():
-    db = session()
+READ_METHODS = ("GET", "HEAD")
+PRIMARY_COOKIE = "db_primary_until"
+
+def wrote_recently(request):
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE) or 0) > time.time()
+    except ValueError:
+        return False
+
+def get_db(request: Request):
+    # Reads go to the replica (when configured) unless this client wrote within the read-your-writes window
+    if request.method in READ_METHODS:
+        db = read_session(primary=wrote_recently(request))
+    else:
+        request.state.db_write = True
+        db = session()
     try:
         yield db
     finally:
         db.close()   
 
+def get_primary_db(request: Request):
+    # For the few GET endpoints that write
+    request.state.db_write = True
+    db = session()
+    try:
+        yield db
+    finally:
+        db.close()
+
 db_dependency = Annotated[Session, Depends(get_db)]
+primary_db_dependency = Annotated[Session, Depends(get_primary_db)]
+
+@contextmanager
+def cache_fill_session(db):
+    # Shared caches are filled from the primary only: an entry built from a lagging replica would be
+    # served to every client, including the one that just wrote
+    if not is_replica(db):
+        yield db
+        return
+    primary = session()
+    try:
+        yield primary
+    finally:
+        primary.close()
+
+def cached_read(request, db, namespace, key, build):
+    """Read-through for the shared inventory cache. A client inside its read-your-writes window skips it."""
+    if wrote_recently(request):
+        return build(db)
+    generation = inventory_cache.generation(namespace)
+    value = inventory_cache.get(namespace, key, generation)
+    if value is None:
+        with cache_fill_session(db) as fill_db:
+            value = build(fill_db)
+        if value is not None:
+            inventory_cache.set(namespace, key, value, generation=generation)
+    return value
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    if getattr(request.state, "db_write", False):
+        # The cookie sends this client's reads to the primary on any worker (see READ_YOUR_WRITES_SCOPE)
+        mark_write()
+        response.set_cookie(PRIMARY_COOKIE, f"{time.time() + READ_YOUR_WRITES_WINDOW:.3f}", max_age=int(READ_YOUR_WRITES_WINDOW) + 1, httponly=True)
+    return response
 
 #fetch Api routes ---------------------------------------
 
 @app.get("/devices", status_code=status.HTTP_200_OK)
-async def full_fetch(db: db_dependency):
+async def full_fetch(request: Request, db: db_dependency):
+    # Served from the shared inventory cache; on a miss only one worker rebuilds it (and probes)
+    if wrote_recently(request):
+        return await build_inventory(db)
+
+    async def fill():
+        with cache_fill_session(db) as fill_db:
+            return await build_inventory(fill_db)
+
+    return await inventory_cache.get_or_compute("inventory", "devices", fill)
+
+def invalidate_inventory():
+    for namespace in INVENTORY_NAMESPACES:
+        inventory_cache.invalidate(namespace)
+
+# Written probe transitions change active/show in the cached inventory, portmap bits and rollup counts
+status_writer.on_flushed.append(invalidate_inventory)
+
+# Status is never written by readers: transitions go to the status writer, which persists them
+# in one bulk UPDATE per interval, and responses overlay them without dirtying the session
+def current_status(target, row):
+    return status_writer.overlay(target, row.id) or (row.active, row.show)
+
+def next_status(status, alive):
+    active, show = status
+    if not alive:
+        # Ping failed (timeout or error)
+        return False, show
+    # Ping succeeded!
+    return (True, True) if active != True else (active, show)
+
+def apply_probe_results(target, rows, row_results):
+    """Record liveness results for `rows`, reporting only real transitions. Returns (alive, changed)."""
+    alive_count = changed = 0
+    for row, res in zip(rows, row_results):
+        alive = not isinstance(res, Exception) and res.alive
+        rtt = res.rtt if alive else None
+        availability_history.record(target, row.id, alive, rtt)
+        probe_scheduler.observe((target, row.id), row.IP, alive, rtt, checks=() if isinstance(res, Exception) else res.tried)
+        status = current_status(target, row)
+        # Hosts without an address are only known from the bridge tables: shown while seen there,
+        # hidden otherwise, as they were before they were checked at all
+        new_status = next_status(status, alive) if row.IP else (alive, alive)
+        if new_status != status:
+            status_writer.report(target, row.id, *new_status)
+            changed += 1
+        alive_count += alive
+    return alive_count, changed
+
+async def build_inventory(db):
 
     devices = db.query(models.Devices).all()
     switches = db.query(models.Switches).all()
@@ -159,56 +331,51 @@ async def full_fetch(db: db_dependency):
     switches_tasks = []
     devices_to_check = [] # Keep track of which device matches which task
     switches_to_check = [] # Keep track of which switch matches which task
+    probed = []
     for device in devices:
-        if device.IP:
-            tasks.append(async_ping(device.IP, count=1, timeout=0.5 , privileged=False  ))
-            devices_to_check.append(device)
-        else:
-            # Handle devices with no IP
-            device.active = False
-            device.show = False 
+        mac = normalize_mac(device.Mac)
+        # Devices with a MAC but no IP are looked up in the switches' bridge host tables
+        if device.IP or len(mac) == 17:
+            # Only hosts the scheduler says are due get probed; the rest keep their last state
+            key = ("devices", device.id)
+            probed.append(key)
+            if probe_scheduler.is_due(key, device.IP):
+                tasks.append(liveness_engine.check(device.IP, mac, device.type, probe_scheduler.timeout_for(key, device.IP)))
+                devices_to_check.append(device)
+        elif current_status("devices", device) != (False, False):
+            # Handle devices with neither an IP nor a valid MAC
+            status_writer.report("devices", device.id, False, False)
 
     for switch in switches:
         if switch.IP:
-            switches_tasks.append(async_ping(switch.IP, count=1, timeout=0.5 , privileged=False  ))
-            switches_to_check.append(switch)
-        else:
-            switch.active = False
-            switch.show = False
+            key = ("switches", switch.id)
+            if probe_scheduler.is_due(key, switch.IP):
+                switches_tasks.append(liveness_engine.check(switch.IP, normalize_mac(switch.Mac), "SWITCH", probe_scheduler.timeout_for(key, switch.IP)))
+                switches_to_check.append(switch)
+        elif current_status("switches", switch) != (False, False):
+            status_writer.report("switches", switch.id, False, False)
+
+    probe_scheduler.retain(probed + [("switches", sw.id) for sw in switches if sw.IP])
 
-    # 2. Run all ping tasks in parallel
+    # 2. Run all liveness checks in parallel (ICMP, TCP or bridge presence depending on device type)
     # asyncio.gather runs all tasks concurrently and waits for them to finish
     results = await asyncio.gather(*tasks, return_exceptions=True)
     switch_results = await asyncio.gather(*switches_tasks, return_exceptions=True)
 
-    # 3. Process the results
-    for device, res in zip(devices_to_check, results):
-        if isinstance(res, Exception) or not res.is_alive:
-            # Ping failed (timeout or error)
-            if device.active != False:
-                device.active = False
-        else:
-            # Ping succeeded!
-            if device.active != True:
-                device.active = True
-                device.show = True
-
-    for switch, res in zip(switches_to_check, switch_results):
-        if isinstance(res, Exception) or not res.is_alive:
-            # Ping failed (timeout or error)
-            if switch.active != False:
-                switch.active = False
-        else:
-            # Ping succeeded!
-            if switch.active != True:
-                switch.active = True
-                switch.show = True
-    
-    # 4. Commit all changes to the database ONCE
-    db.commit()
+    # 3. Process the results, reporting only real transitions
+    apply_probe_results("devices", devices_to_check, results)
+    apply_probe_results("switches", switches_to_check, switch_results)
+
+    # 4. Overlay unpersisted status on the loaded rows; committed values, so nothing is ever flushed
+    for target, rows in (("devices", devices), ("switches", switches)):
+        for row in rows:
+            overlay = status_writer.overlay(target, row.id)
+            if overlay:
+                set_committed_value(row, "active", overlay[0])
+                set_committed_value(row, "show", overlay[1])
     # ------------------------------------
 
-    return {
+    return jsonable_encoder({
     "devices": [
         {
         "id": d.id,
@@ -294,7 +461,7 @@ async def full_fetch(db: db_dependency):
         ]
     }
     for p in patch_panels
-    ]}
+    ]})
     
 @app.get("/test", status_code=status.HTTP_200_OK)
 def test_endpoint(db:db_dependency):
@@ -306,6 +473,139 @@ def test_endpoint(db:db_dependency):
         print(f"Test error: {e}")
         return {"status": "error", "message": str(e)}
 
+#Rack view: one switch as parallel arrays, bit flags per port
+PORT_LINKED, PORT_ACTIVE, PORT_SHOW, PORT_PATCHED = 1, 2, 4, 8
+
+def build_portmap(db, switch_id):
+    S, P, D, PP = models.Switches, models.Ports, models.Devices, models.PatchPanelPorts
+    rows = db.execute(
+        select(S.name, S.total_ports, P.id, P.port_number, P.version, P.device_id, D.active, D.show, PP.id)
+        .select_from(S)
+        .outerjoin(P, P.switch_id == S.id)
+        .outerjoin(D, P.device_id == D.id)
+        .outerjoin(PP, PP.switch_port_id == P.id)
+        .where(S.id == switch_id)
+        .order_by(P.port_number)
+    ).all()
+    if not rows:
+        return None
+    fiber = db.execute(
+        select(models.FiberPorts.id, models.FiberPorts.port_number, models.FiberPorts.title)
+        .where(models.FiberPorts.switch_id == switch_id)
+        .order_by(models.FiberPorts.port_number)
+    ).all()
+    ports = [r for r in rows if r[2] is not None]
+    status_bits = []
+    for _, _, _, _, _, device_id, active, show, pp_id in ports:
+        overlay = status_writer.overlay("devices", device_id) if device_id else None
+        if overlay:
+            active, show = overlay
+        status_bits.append(
+            (PORT_LINKED if device_id else 0) | (PORT_ACTIVE if active else 0)
+            | (PORT_SHOW if show else 0) | (PORT_PATCHED if pp_id else 0)
+        )
+    return {
+        "switch_id": switch_id,
+        "name": rows[0][0],
+        "total_ports": rows[0][1],
+        # Port versions only grow, so their sum moves whenever any link on this switch changes
+        "version": sum(r[4] or 0 for r in ports),
+        "bits": {"linked": PORT_LINKED, "active": PORT_ACTIVE, "show": PORT_SHOW, "patched": PORT_PATCHED},
+        "port_number": [r[3] for r in ports],
+        "port_id": [r[2] for r in ports],
+        "device_id": [r[5] for r in ports],
+        "patch_panel_port_id": [r[8] for r in ports],
+        "status": status_bits,
+        "fiber_ports": {
+            "port_number": [f[1] for f in fiber],
+            "id": [f[0] for f in fiber],
+            "title": [f[2] for f in fiber],
+        },
+    }
+
+@app.get("/switches/{switch_id}/portmap", status_code=status.HTTP_200_OK)
+def switch_portmap(switch_id: int, request: Request, db: db_dependency, if_none_match: Annotated[Optional[str], Header()] = None):
+    def build(db):
+        portmap = build_portmap(db, switch_id)
+        if portmap is None:
+            return None
+        digest = hashlib.sha1(json.dumps(portmap, sort_keys=True).encode()).hexdigest()[:16]
+        return {"etag": f'"{portmap["version"]}-{digest}"', "portmap": portmap}
+
+    cached = cached_read(request, db, "portmap", str(switch_id), build)
+    if cached is None:
+        raise HTTPException(status_code=404, detail='Switch not found')
+    headers = {"ETag": cached["etag"], "Cache-Control": "no-cache"}
+    if if_none_match == cached["etag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(cached["portmap"], headers=headers)
+
+#Dashboard rollups: per-floor and site-wide counts, cached until the next write or status flush
+def floor_rollup(request, db):
+    return cached_read(request, db, "rollup", "floors", build_rollup)
+
+@app.get("/stats/floors", status_code=status.HTTP_200_OK)
+def floor_stats(request: Request, db: db_dependency):
+    return floor_rollup(request, db)
+
+@app.get("/stats/floors/{floor}", status_code=status.HTTP_200_OK)
+def floor_stats_one(floor: int, request: Request, db: db_dependency):
+    stats = floor_rollup(request, db)["floors"].get(str(floor))
+    if stats is None:
+        raise HTTPException(status_code=404, detail='Nothing on this floor')
+    return {"floor": floor, **stats}
+
+#IP address analysis across every table with an IP column
+@app.get("/ipam/analysis", status_code=status.HTTP_200_OK)
+def ip_analysis(db: db_dependency, prefix: int = 24):
+    if not 8 <= prefix <= 32:
+        raise HTTPException(status_code=400, detail='prefix must be between 8 and 32')
+    return ipam.analyze(ipam.IpTable.load(db), prefix)
+
+@app.get("/ipam/free", status_code=status.HTTP_200_OK)
+def ip_free(db: db_dependency, subnet: str, limit: int = 20):
+    try:
+        ipaddress.IPv4Network(subnet, strict=False)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='subnet must look like 192.168.1.0/24')
+    return ipam.free_ranges(ipam.IpTable.load(db), subnet, limit)
+
+#MAC audit: malformed, duplicate and unusual MACs across the inventory, with vendors
+@app.get("/audit/macs", status_code=status.HTTP_200_OK)
+def mac_audit(db: db_dependency):
+    sources, ids, raw = [], [], []
+    for name, model in ipam.IP_SOURCES.items():
+        for row_id, mac in db.execute(select(model.id, model.Mac).where(model.Mac.is_not(None), model.Mac != "")):
+            sources.append(name)
+            ids.append(row_id)
+            raw.append(mac)
+    mac, valid = parse_macs(raw)
+    flags = classify(mac, valid)
+    vendors = oui_table.vendors(mac)
+    text = format_macs(mac)
+    row = lambda i: {"source": sources[i], "id": ids[i], "Mac": raw[i]}
+
+    values, counts = np.unique(mac[valid], return_counts=True)
+    dup_values = values[counts > 1]
+    dup_idx = np.nonzero(valid & np.isin(mac, dup_values))[0]
+    duplicates = defaultdict(list)
+    for i in dup_idx[np.argsort(mac[dup_idx], kind="stable")]:
+        duplicates[str(text[i])].append(row(i))
+
+    vendor_names, vendor_counts = np.unique(
+        np.where(vendors[valid] != None, vendors[valid], "unknown").astype(str), return_counts=True
+    )
+    return {
+        "total": len(raw),
+        "valid": int(valid.sum()),
+        "malformed": [row(i) for i in np.nonzero(flags & MALFORMED)[0]],
+        "multicast": [row(i) for i in np.nonzero(flags & MULTICAST)[0]],
+        "locally_administered": [row(i) for i in np.nonzero(flags & LOCAL)[0]],
+        "zero": [row(i) for i in np.nonzero(flags & ZERO)[0]],
+        "duplicates": [{"Mac": m, "count": len(h), "holders": h} for m, h in duplicates.items()],
+        "vendors": dict(zip(vendor_names.tolist(), vendor_counts.tolist())),
+    }
+
 #--- this code is just for the process of adding devices to our database
 @app.get("/switches/available-ports")
 def get_available_switch_ports(db:db_dependency, floor: Optional[int] = None):
@@ -366,6 +666,7 @@ def add(db:db_dependency, device:DeviceBase):
         db_device = models.Devices(**device.__dict__, Date=datetime.now())
         db.add(db_device)
         db.commit()
+        invalidate_inventory()
 
 
 @app.put("/edit/{id}", status_code=status.HTTP_200_OK)
@@ -380,6 +681,7 @@ def edit(db:db_dependency, id:int, device:DeviceUpdate):
         setattr(db_device, key, value)
     
     db.commit()
+    invalidate_inventory()
     db.refresh(db_device)
     return db_device
 
@@ -415,6 +717,7 @@ def add_patch_panel(db:db_dependency, patch_panel:PatchPanelBase):
     patch_panel_ports = [models.PatchPanelPorts(port_number=i, patch_panel_id=db_patch_panel.id, title=f"{db_patch_panel.title}-{i}P") for i in range(1, 25)]
     db.add_all(patch_panel_ports)
     db.commit()  # Commit first to get IDs
+    invalidate_inventory()
     
     # Handle port connections if provided in request
     if hasattr(patch_panel, 'ports') and patch_panel.ports:
@@ -430,6 +733,7 @@ def add_patch_panel(db:db_dependency, patch_panel:PatchPanelBase):
                     pp_port.switch_port_id = port_data['switch_port']['id']
         
         db.commit()
+        invalidate_inventory()
     
     return db_patch_panel
 
@@ -493,6 +797,7 @@ def add_switch(db:db_dependency, switch:SwitchBase):
     db.add_all(ports)
     db.add_all(fiber_ports)
     db.commit()
+    invalidate_inventory()
     return db_switch
 
 @app.put("/edit/switch/{id}", status_code=status.HTTP_200_OK)
@@ -507,6 +812,7 @@ def edit_switch(db:db_dependency, id:int, switch:SwitchBase):
             setattr(db_switch, key, value)
     
     db.commit()
+    invalidate_inventory()
     db.refresh(db_switch)
     return db_switch
 
@@ -528,6 +834,7 @@ def edit_patch_panel(db:db_dependency, id:int, patch_panel:PatchPanelBase):
             db_patch_panel.show = patch_panel.show
         
         db.commit()
+        invalidate_inventory()
         db.refresh(db_patch_panel)
         return db_patch_panel
         
@@ -535,32 +842,27 @@ def edit_patch_panel(db:db_dependency, id:int, patch_panel:PatchPanelBase):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+def port_conflict(e, **extra):
+    # detail stays a plain string like every other error; the port as it is now goes next to it
+    return JSONResponse({"detail": e.detail, "current": e.current, **extra}, status_code=409)
+
 @app.post("/switch/{id}/port/{port_id}")
-def update_switch_port(db:db_dependency, id:int, port_id:int, device_id: Optional[int] = None):
+def update_switch_port(db:db_dependency, id:int, port_id:int, device_id: Optional[int] = None, expected_version: Optional[int] = None):
     db_switch = db.query(models.Switches).filter(models.Switches.id == id).first()
     if db_switch is None:
         raise HTTPException(status_code=404 , detail='Switch not found')
-    
-    switch_port = db.query(models.Ports).filter_by(switch_id=id, port_number=port_id).first()
-    if switch_port is None:
-        raise HTTPException(status_code=404, detail='Switch Port not found')
 
-    if device_id is None:
-        # Disconnect device from port
-        switch_port.device_id = None
-    else:
-        # Connect device to port
-        device = db.query(models.Devices).filter_by(id=device_id).first()
-        if device is None:
-            raise HTTPException(status_code=404, detail='Device not found')
-        
-        # Check if device is already connected to another port
-        if device.port:
-            raise HTTPException(status_code=409, detail='Device already connected to another port')
-        
-        switch_port.device_id = device_id
+    # One conditional UPDATE: linking needs a free port (or the version the client last saw)
+    try:
+        switch_port = link_switch_port(db, id, port_id, device_id, expected_version)
+    except PortNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PortConflict as e:
+        db.rollback()
+        return port_conflict(e)
     
     db.commit()
+    invalidate_inventory()
     db.refresh(switch_port)
     
     # Return with device data
@@ -569,6 +871,7 @@ def update_switch_port(db:db_dependency, id:int, port_id:int, device_id: Optiona
         "port_number": switch_port.port_number,
         "switch_id": switch_port.switch_id,
         "device_id": switch_port.device_id,
+        "version": switch_port.version,
         "device": {
             "id": switch_port.device.id,
             "name": switch_port.device.name,
@@ -578,7 +881,7 @@ def update_switch_port(db:db_dependency, id:int, port_id:int, device_id: Optiona
     }
 
 @app.post("/patchpanel/{id}/port/{port_id}")
-def update_patch_panel_port(db:db_dependency, id:int, port_id:int, switch_port_id: Optional[int] = None, cable_number: Optional[str] = None, cable_length: Optional[str] = None):
+def update_patch_panel_port(db:db_dependency, id:int, port_id:int, switch_port_id: Optional[int] = None, cable_number: Optional[str] = None, cable_length: Optional[str] = None, expected_version: Optional[int] = None):
     print(f"Updating patch panel port {port_id} for patch panel {id}")
     print(f"Switch port ID: {switch_port_id}")
     print(f"Cable number: {cable_number}")
@@ -586,32 +889,45 @@ def update_patch_panel_port(db:db_dependency, id:int, port_id:int, switch_port_i
     db_patch_panel = db.query(models.PatchPanels).filter(models.PatchPanels.id == id).first()
     if db_patch_panel is None:
         raise HTTPException(status_code=404 , detail='Patch Panel not found')
-    pp_port = db.query(models.PatchPanelPorts).filter_by(patch_panel_id=id, port_number=port_id).first()
-    if pp_port is None:
-        raise HTTPException(status_code=404, detail='Patch Panel Port not found')
 
+    # switch_port_id: 0 unlinks, omitted keeps the current link (cable info only)
     if switch_port_id == 0:
-        pp_port.switch_port_id = None
+        target = None
+    elif switch_port_id is None:
+        target = UNCHANGED
     else:
-        if switch_port_id is not None:
-            switch_port = db.query(models.Ports).filter_by(id=switch_port_id).first()
-            if switch_port is None:
-                raise HTTPException(status_code=404, detail='Switch Port not found')
-            
-            if switch_port.patch_panel_port:
-                raise HTTPException(status_code=409, detail='Switch Port already taken')
-            pp_port.switch_port_id = switch_port_id
-    
-    # Update cable information if provided
-    if cable_number is not None:
-        pp_port.cable_number = cable_number
-    if cable_length is not None:
-        pp_port.cable_length = cable_length
+        target = switch_port_id
+    try:
+        pp_port = link_patch_panel_port(db, id, port_id, target, expected_version, cable_number, cable_length)
+    except PortNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PortConflict as e:
+        db.rollback()
+        return port_conflict(e)
     
     db.commit()
+    invalidate_inventory()
     db.refresh(pp_port)
     return pp_port
 
+@app.post("/ports/link", status_code=status.HTTP_200_OK)
+def link_ports(db:db_dependency, changes: List[PortLinkChange]):
+    """Apply many port links/unlinks atomically: all of them, in order, or none."""
+    for change in changes:
+        if (change.switch_id is None) == (change.patch_panel_id is None):
+            raise HTTPException(status_code=400, detail='Each change needs exactly one of switch_id or patch_panel_id')
+    try:
+        applied = apply_links(db, changes)
+    except PortNotFound as e:
+        return JSONResponse({"detail": str(e), "index": e.index}, status_code=404)
+    except PortConflict as e:
+        return port_conflict(e, index=e.index)
+    invalidate_inventory()
+    return {"applied": applied}
+
+# Switch/router OUIs (MikroTik) that show up on every bridge and are never end devices
+IGNORED_OUIS = oui_of(['D4:01:C3', '18:FD:74', 'C4:AD:34', '74:4D:28', 'DC:2C:6E', '48:8F:5A'])
+
 def normalize_mac(mac: str) -> str:
     if not mac: return ""
     # Strip everything and rebuild format AA:BB:CC:DD:EE:FF
@@ -619,8 +935,24 @@ def normalize_mac(mac: str) -> str:
     if len(clean) != 12: return clean # Fallback for weird data
     return ":".join(clean[i:i+2] for i in range(0, 12, 2))
 
-@app.get("/auto/ports/{switch_id}")
-def auto_assign_ports(switch_id: int, db: db_dependency):
+def read_bridge_hosts(ip):
+    with router_sessions.api(ip) as api:
+        return api.get_resource('/interface/bridge/host').get()
+
+def remember_bridge_hosts(switch_id, hosts):
+    """Record who is on a switch's bridge, so MAC-only and ICMP-blocking devices can still be seen as alive.
+
+    Returns the hosts' MACs parsed as (uint64 array, valid mask)."""
+    host_macs, host_valid = parse_macs([e.get('mac-address', '') for e in hosts])
+    liveness_engine.bridge_table.update(
+        switch_id, [(str(m), e.get('on-interface')) for m, ok, e in zip(format_macs(host_macs), host_valid, hosts) if ok]
+    )
+    return host_macs, host_valid
+
+def discover_switch(db, switch_id, check_cancelled=None):
+    """Link switch ports to devices from the switch's bridge host table. Returns (switch, assignments made).
+
+    `check_cancelled` (a job's) is called before anything is committed."""
     # 1. Fetch Switch
     db_switch = db.query(models.Switches).filter(models.Switches.id == switch_id).first()
     if not db_switch:
@@ -643,59 +975,45 @@ def auto_assign_ports(switch_id: int, db: db_dependency):
     ).all()
     
 
-    unconnected_devs_map = {}
-    for d in devices_in_db:
-        # Check if the device is actually "unconnected"
-        # Using strip() because sometimes DBs store empty strings instead of NULLs
-        #if d.port is None or str(d.port).strip() == "":
-            unconnected_devs_map[normalize_mac(d.Mac)] = d
+    # Whole MAC columns are parsed to 48-bit integers at once; lookups below are int -> device
+    dev_macs, dev_valid = parse_macs([d.Mac for d in devices_in_db])
+    unconnected_devs_map = {
+        int(mac): d for mac, ok, d in zip(dev_macs, dev_valid, devices_in_db) if ok
+    }
 
-    MAC_DEVICES = unconnected_devs_map.keys()
-    print(f"DEBUG: Search set contains: {list(MAC_DEVICES)}", len(MAC_DEVICES))
-    # DEBUG: Print how many devices were actually loaded into memory
-    print(f"Loaded {len(MAC_DEVICES)} unconnected devices from DB.")
+    print(f"Loaded {len(unconnected_devs_map)} devices with valid MACs from DB ({int((~dev_valid).sum())} malformed).")
+
+    # Bracket the run with snapshots so /snapshots/diff shows exactly what it changed
+    # (a no-op when nothing changed since the last one). Both are taken on the snapshot thread:
+    # this one while the router is read, and it is waited for before anything is committed
+    before = topology_snapshots.submit(f"before auto-assign switch {switch_id}")
 
     # 3. Connect to Mikrotik
     try:
-        api_pool = RouterOsApiPool(
-            host=db_switch.IP,
-            username="admin",
-            password="555288",
-            plaintext_login=True
-        )
-        api = api_pool.get_api()
-        resource = api.get_resource('/interface/bridge/host')
-        all_hosts = resource.get()
-        api_pool.disconnect() 
+        all_hosts = read_bridge_hosts(db_switch.IP)
 
-        print(all_hosts)
+        host_macs, host_valid = remember_bridge_hosts(switch_id, all_hosts)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"API Connection Error: {str(e)}")
 
     # 4. Filter and Group MACs
-    IGNORED_PREFIXES = ('D4:01:C3', '18:FD:74', 'C4:AD:34', '74:4D:28', 'DC:2C:6E', '48:8F:5A')
+    ignored = np.isin((host_macs >> np.uint64(24)).astype(np.uint32), IGNORED_OUIS)
     port_map = defaultdict(list)
     
-    for entry in all_hosts:
+    for entry, mac, ok, skip in zip(all_hosts, host_macs.tolist(), host_valid, ignored):
         raw_port = entry.get('on-interface', '')
         port_num = raw_port.replace('ether', '') if raw_port.startswith('ether') else None
-        mac = normalize_mac(entry.get('mac-address', ''))
 
-        if not port_num or not mac:
-            continue
-            
-        if mac.startswith(IGNORED_PREFIXES):
-            print(f"DEBUG: Ignoring MAC: {mac}")
+        if not port_num or not ok or skip:
             continue
-        print(f"DEBUG: Checking MAC: {mac} - Found in DB: {mac in MAC_DEVICES}")
 
-        if mac not in MAC_DEVICES:
-            # This is your current headache. 
-            # If this prints, the MAC is 100% NOT in the 'unconnected_devs_map'
+        if mac not in unconnected_devs_map:
             continue
             
         port_map[port_num].append(mac)
-    print(len(port_map), "ports with connected devices found.")
+    print(len(port_map), "ports with connected devices found.", int(ignored.sum()), "infrastructure MACs ignored.")
 
     # 5. Process Assignments
     assignments_made = 0
@@ -713,9 +1031,27 @@ def auto_assign_ports(switch_id: int, db: db_dependency):
                 print(f"Match: Port {port_num} -> {device.name}")
 
     if assignments_made > 0:
-        db.commit()
+        before = before.result()
+        if check_cancelled is not None:
+            check_cancelled()
+        try:
+            db.commit()
+        except StaleDataError:
+            # A technician changed one of these ports meanwhile (version mismatch)
+            db.rollback()
+            raise HTTPException(status_code=409, detail='Ports changed during auto-assignment, run it again')
+        invalidate_inventory()
         db.refresh(db_switch)
-    
+        after = topology_snapshots.submit(f"auto-assign switch {switch_id}")
+        after.add_done_callback(
+            lambda f: print(f"Auto-assign snapshots: {before['id']} -> {f.result()['id']}" if not f.exception()
+                            else f"Auto-assign snapshot failed: {f.exception()}")
+        )
+    return db_switch, assignments_made
+
+@app.get("/auto/ports/{switch_id}")
+def auto_assign_ports(switch_id: int, db: primary_db_dependency):
+    db_switch, _ = discover_switch(db, switch_id)
     return {"switches":
         {
         "id": db_switch.id,
@@ -764,22 +1100,307 @@ def turn_off_device(device_id: int, db: db_dependency):
         raise HTTPException(status_code=400, detail="Device has no IP address")
     
     try:
-        api_pool = RouterOsApiPool(
-            host=device.IP,
-            username="admin",
-            password="555288",
-            plaintext_login=True
-        )
-        api = api_pool.get_api()
-        resource = api.get_resource('/interface/ethernet/poe')
-        api_pool.disconnect() 
+        with router_sessions.api(device.IP) as api:
+            resource = api.get_resource('/interface/ethernet/poe')
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"API Connection Error: {str(e)}")
     
     return {"detail": f"Shutdown command sent to device {device.name}"}
 
+#PoE status is polled in the background, these routes only read the cache
+@app.get("/poe", status_code=status.HTTP_200_OK)
+def poe_summary():
+    return poe_cache.summary()
+
+@app.get("/poe/{switch_id}", status_code=status.HTTP_200_OK)
+def poe_switch(switch_id: int):
+    snapshot = poe_cache.get(switch_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail='No PoE data for this switch')
+    return snapshot
+
+#Background jobs: discovery, ping sweeps and PoE batches run on the job queue, not in request handlers
+POE_ACTIONS = {"on": "auto-on", "auto-on": "auto-on", "forced-on": "forced-on", "off": "off", "power-cycle": None}
+JOB_PARAMS = {
+    "discovery": {"switch_id"},
+    "ping_sweep": set(),
+    "poe_batch": {"switch_id", "interfaces", "action"},
+    "ip_ingest": set(),
+    "bridge_refresh": set(),
+}
+
+class JobRequest(BaseModel):
+    kind: str
+    params: dict = {}
+
+def _http_error(e):
+    return f"{e.status_code}: {e.detail}" if isinstance(e, HTTPException) else str(e)
+
+async def discovery_job(job, params):
+    def run():
+        db = session()
+        try:
+            db_switch, assignments = discover_switch(db, int(params["switch_id"]), job.check_cancelled)
+            return {"switch_id": db_switch.id, "name": db_switch.name, "assignments": assignments}
+        except HTTPException as e:
+            raise RuntimeError(_http_error(e))
+        finally:
+            db.close()
+    await asyncio.to_thread(job.progress, 0, 1, "reading bridge hosts")
+    result = await job.to_thread(run)
+    await asyncio.to_thread(job.progress, 1, 1, f"{result['assignments']} ports assigned")
+    return result
+
+def load_sweep_targets(targets):
+    db = session()
+    try:
+        rows = []
+        if "devices" in targets:
+            rows += [("devices", d, d.type) for d in db.query(models.Devices).filter(models.Devices.IP != None, models.Devices.IP != "")]
+        if "switches" in targets:
+            rows += [("switches", s, "SWITCH") for s in db.query(models.Switches).filter(models.Switches.IP != None, models.Switches.IP != "")]
+        return rows
+    finally:
+        db.close()
+
+async def ping_sweep_job(job, params):
+    # Probes every host regardless of the scheduler's due times, in chunks so progress is visible
+    targets = params.get("targets") or ["devices", "switches"]
+    chunk = int(params.get("chunk", 256))
+    rows = await asyncio.to_thread(load_sweep_targets, targets)
+    alive = changed = 0
+    for i in range(0, len(rows), chunk):
+        part = rows[i:i + chunk]
+        results = await asyncio.gather(*(
+            liveness_engine.check(row.IP, normalize_mac(row.Mac), kind, probe_scheduler.timeout_for((target, row.id), row.IP))
+            for target, row, kind in part
+        ), return_exceptions=True)
+        for target in targets:
+            picked = [(row, res) for (t, row, _), res in zip(part, results) if t == target]
+            a, c = apply_probe_results(target, [r for r, _ in picked], [res for _, res in picked])
+            alive += a
+            changed += c
+        await asyncio.to_thread(job.progress, min(i + chunk, len(rows)), len(rows), f"{alive} alive")
+    if changed:
+        invalidate_inventory()
+    return {"probed": len(rows), "alive": alive, "down": len(rows) - alive, "changed": changed}
+
+def set_poe(job, switch, interfaces, action, duration):
+    results = []
+    with router_sessions.api(switch["IP"]) as api:
+        resource = api.get_resource('/interface/ethernet/poe')
+        for n, name in enumerate(interfaces):
+            job.check_cancelled()
+            try:
+                if POE_ACTIONS[action] is None:
+                    resource.call('power-cycle', {'numbers': name, 'duration': f"{duration}s"})
+                else:
+                    resource.set(id=name, poe_out=POE_ACTIONS[action])
+                results.append({"interface": name, "ok": True, "error": None})
+            except Exception as e:
+                results.append({"interface": name, "ok": False, "error": str(e)})
+            job.progress(n + 1, len(interfaces), name)
+    return results
+
+async def poe_batch_job(job, params):
+    action = params["action"]
+    if action not in POE_ACTIONS:
+        raise ValueError(f"Unknown PoE action {action!r}, expected one of {sorted(POE_ACTIONS)}")
+    interfaces = [f"ether{i}" if isinstance(i, int) else str(i) for i in params["interfaces"]]
+
+    def load():
+        db = session()
+        try:
+            s = db.query(models.Switches).filter(models.Switches.id == int(params["switch_id"])).first()
+            return {"id": s.id, "IP": s.IP} if s else None
+        finally:
+            db.close()
+    switch = await asyncio.to_thread(load)
+    if not switch or not switch["IP"]:
+        raise ValueError("Switch not found or has no IP")
+    results = await job.to_thread(set_poe, job, switch, interfaces, action, int(params.get("duration", 5)))
+    return {"switch_id": switch["id"], "action": action, "failed": sum(not r["ok"] for r in results), "interfaces": results}
+
+async def ip_ingest_job(job, params):
+    # Devices with a MAC but no IP are never probed; the routers' ARP/DHCP tables fill that in
+    await asyncio.to_thread(job.progress, 0, 2, "reading ARP and DHCP tables")
+    result = await leases.ingest(params.get("routers"), bool(params.get("overwrite")), bool(params.get("dry_run")))
+    if result["written"]:
+        invalidate_inventory()
+    await asyncio.to_thread(job.progress, 2, 2, f"{result['written']} device IPs written")
+    return result
+
+def load_bridge_switches():
+    db = session()
+    try:
+        return db.execute(select(models.Switches.id, models.Switches.IP).where(models.Switches.IP != None, models.Switches.IP != "")).all()
+    finally:
+        db.close()
+
+async def bridge_refresh_job(job, params):
+    # Only reads the bridge host tables for the "bridge" liveness check; ports are left alone (see discovery)
+    switches = await asyncio.to_thread(load_bridge_switches)
+    semaphore = asyncio.Semaphore(BRIDGE_REFRESH_CONCURRENCY)
+
+    async def one(switch_id, ip):
+        async with semaphore:
+            hosts = await asyncio.to_thread(read_bridge_hosts, ip)
+            await asyncio.to_thread(remember_bridge_hosts, switch_id, hosts)
+            return len(hosts)
+
+    results = await asyncio.gather(*(one(i, ip) for i, ip in switches), return_exceptions=True)
+    errors = {i: str(r) for (i, _), r in zip(switches, results) if isinstance(r, Exception)}
+    await asyncio.to_thread(job.progress, len(switches), len(switches), f"{len(switches) - len(errors)} switches read")
+    return {
+        "switches": len(switches),
+        "hosts": sum(r for r in results if not isinstance(r, Exception)),
+        "errors": errors,
+    }
+
+def scheduled_discovery():
+    db = session()
+    try:
+        ids = [i for (i,) in db.execute(select(models.Switches.id).where(models.Switches.IP != None, models.Switches.IP != ""))]
+    finally:
+        db.close()
+    return [("discovery", {"switch_id": i}) for i in ids]
+
+job_queue.register("discovery", discovery_job)
+job_queue.register("ping_sweep", ping_sweep_job)
+job_queue.register("poe_batch", poe_batch_job)
+job_queue.register("ip_ingest", ip_ingest_job)
+job_queue.register("bridge_refresh", bridge_refresh_job)
+job_queue.schedule(JOBS_PING_SWEEP_INTERVAL, lambda: [("ping_sweep", {})])
+job_queue.schedule(JOBS_DISCOVERY_INTERVAL, scheduled_discovery)
+job_queue.schedule(JOBS_IP_INGEST_INTERVAL, lambda: [("ip_ingest", {})])
+job_queue.schedule(JOBS_BRIDGE_REFRESH_INTERVAL, lambda: [("bridge_refresh", {})])
+
+@app.get("/jobs", status_code=status.HTTP_200_OK)
+def list_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 100):
+    return job_queue.list(status, kind, limit)
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+def create_job(request: JobRequest):
+    if request.kind not in JOB_PARAMS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind, expected one of {sorted(JOB_PARAMS)}")
+    missing = JOB_PARAMS[request.kind] - set(request.params)
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing params: {sorted(missing)}")
+    job, created = job_queue.enqueue(request.kind, request.params)
+    # An identical job already queued or running is returned as-is
+    return {**job, "deduplicated": not created}
+
+@app.get("/jobs/{job_id}", status_code=status.HTTP_200_OK)
+def get_job(job_id: int):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return job
+
+@app.post("/jobs/{job_id}/cancel", status_code=status.HTTP_200_OK)
+def cancel_job(job_id: int):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return job
+
+#Spreadsheet exports, streamed straight from the database cursor
+@app.get("/export/{kind}", status_code=status.HTTP_200_OK)
+def export_inventory(kind: str, format: str = "csv"):
+    if kind not in export.EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export, expected one of {sorted(export.EXPORTS)}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or xlsx")
+    try:
+        chunks = export.export(kind, format)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    filename = f"{kind}-{datetime.now():%Y%m%d-%H%M}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+#Topology snapshots: port mappings and device addresses over time
+@app.get("/snapshots", status_code=status.HTTP_200_OK)
+def list_snapshots(limit: int = 100):
+    return topology_snapshots.list(limit)
+
+@app.post("/snapshots", status_code=status.HTTP_201_CREATED)
+def take_snapshot(label: Optional[str] = None):
+    return topology_snapshots.take(label or "manual")
+
+@app.get("/snapshots/diff", status_code=status.HTTP_200_OK)
+def diff_snapshots(from_id: int, to_id: Optional[int] = None):
+    to_id = to_id if to_id is not None else topology_snapshots.latest_id()
+    if to_id is None:
+        raise HTTPException(status_code=404, detail='No snapshots yet')
+    return topology_snapshots.diff(from_id, to_id)
+
+@app.get("/snapshots/{snapshot_id}", status_code=status.HTTP_200_OK)
+def get_snapshot(snapshot_id: int):
+    snapshot = topology_snapshots.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail='Snapshot not found')
+    return snapshot
+
+#Availability history, recorded from the /devices probes
+HISTORY_TARGETS = ("devices", "switches")
+
+def history_window(target: str, start: Optional[datetime], end: Optional[datetime]):
+    if target not in HISTORY_TARGETS:
+        raise HTTPException(status_code=404, detail='Unknown history target')
+    end = end or datetime.now()
+    start = start or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail='start must be before end')
+    return start.timestamp(), end.timestamp()
+
+@app.get("/history/{target}/{target_id}/uptime", status_code=status.HTTP_200_OK)
+def history_uptime(target: str, target_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    start_ts, end_ts = history_window(target, start, end)
+    return {"id": target_id, "start": start_ts, "end": end_ts, **availability_history.uptime(target, target_id, start_ts, end_ts)}
+
+@app.get("/history/{target}/{target_id}/flaps", status_code=status.HTTP_200_OK)
+def history_flaps(target: str, target_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    start_ts, end_ts = history_window(target, start, end)
+    return {"id": target_id, "start": start_ts, "end": end_ts, **availability_history.flaps(target, target_id, start_ts, end_ts)}
+
+@app.get("/history/{target}/{target_id}/rtt", status_code=status.HTTP_200_OK)
+def history_rtt(target: str, target_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    start_ts, end_ts = history_window(target, start, end)
+    return {"id": target_id, "start": start_ts, "end": end_ts, **availability_history.rtt(target, target_id, start_ts, end_ts)}
+
+@app.get("/metrics/cache", status_code=status.HTTP_200_OK)
+def cache_metrics():
+    return inventory_cache.metrics()
+
+@app.get("/metrics/status", status_code=status.HTTP_200_OK)
+def status_metrics():
+    return status_writer.metrics()
+
+@app.get("/metrics/probes", status_code=status.HTTP_200_OK)
+def probe_metrics():
+    return probe_scheduler.metrics()
+
+@app.get("/metrics/db", status_code=status.HTTP_200_OK)
+def db_metrics():
+    return database.metrics()
+
+@app.get("/metrics/jobs", status_code=status.HTTP_200_OK)
+def job_metrics():
+    return job_queue.metrics()
+
+@app.get("/routeros/sessions", status_code=status.HTTP_200_OK)
+def routeros_sessions():
+    return router_sessions.status()
+
 
 #this code is just for running the fastapi project without trying to use uvicorn from the terminal .... :)
+#(development only, production runs through serve.py)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -789,6 +1410,7 @@ app.add_middleware(
 )
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -0,0 +1,36 @@
+"""Columns added to existing tables after they were first created.
+
+`create_all` only creates missing tables, so new columns on old tables are added here.
+Runs from db.sync_schema() at startup, or by hand:
+
+    python migrations.py
+"""
+from sqlalchemy import inspect, text
+
+# (table, column, DDL type) -- additive only, every column needs a default for existing rows
+COLUMNS = [
+    ("ports", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("patch_panel_ports", "version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def add_missing_columns(engine):
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table, column, ddl in COLUMNS:
+            if table not in tables:
+                continue  # create_all builds it with the column already
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            added.append(f"{table}.{column}")
+    return added
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    added = add_missing_columns(get_engine())
+    print(f"Added: {', '.join(added)}" if added else "Schema already up to date")
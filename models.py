@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, String, Column, Integer, Date, ForeignKey, Table, null
+from sqlalchemy import Boolean, String, Column, Integer, BigInteger, Date, Float, ForeignKey, Index, LargeBinary, Table, null
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from sqlalchemy.orm import relationship
@@ -86,10 +86,14 @@ class PatchPanelPorts(Base):
     function = Column(String(100))
     patch_panel_id = Column(Integer, ForeignKey('patchpanels.id'))
     switch_port_id = Column(Integer, ForeignKey('ports.id'), nullable=True, unique=True)
+    version = Column(Integer, nullable=False, default=0, server_default='0')
 
     patch_panel = relationship('PatchPanels', back_populates='ports')
     switch_port = relationship('Ports')
 
+    # Every UPDATE checks and bumps `version`; concurrent edits fail instead of overwriting
+    __mapper_args__ = {'version_id_col': version}
+
     
 class Ports(Base):
     __tablename__ = "ports"
@@ -107,6 +111,9 @@ class Ports(Base):
 
     created_at = Column(Date, default=datetime.now)
     updated_at = Column(Date, default=datetime.now, onupdate=datetime.now)
+    version = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __mapper_args__ = {'version_id_col': version}
 
 class FiberPorts(Base):
     __tablename__ = "fiber_ports"
@@ -185,3 +192,45 @@ class Cabinet(Base):
     show = Column(Boolean)
     Date = Column(String(100))
 
+
+
+class AvailabilityTransitions(Base):
+    # Run-length encoded probe history: one row per state change, not per ping
+    __tablename__ = "availability_transitions"
+    __table_args__ = (Index('ix_availability_target_ts', 'target', 'target_id', 'ts'),)
+
+    id = Column(Integer, primary_key=True)
+    target = Column(String(10), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    ts = Column(BigInteger, nullable=False)  # epoch milliseconds
+    active = Column(Boolean, nullable=False)
+
+
+class AvailabilityRtt(Base):
+    # Per-interval RTT aggregates: one row per host, interval and worker, summed at query time.
+    # histogram holds uint32 counts over log-spaced RTT bins (see history.py) for the percentiles
+    __tablename__ = "availability_rtt"
+    __table_args__ = (Index('ix_availability_rtt_target_bucket', 'target', 'target_id', 'bucket'),)
+
+    id = Column(Integer, primary_key=True)
+    target = Column(String(10), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    bucket = Column(BigInteger, nullable=False)  # interval start, epoch milliseconds
+    samples = Column(Integer, nullable=False)
+    failures = Column(Integer, nullable=False)
+    rtt_min = Column(Float, nullable=True)
+    rtt_max = Column(Float, nullable=True)
+    histogram = Column(LargeBinary, nullable=False)
+
+
+class TopologySnapshots(Base):
+    # Columnar (npz) topology snapshots: every row holds the delta from the previous one,
+    # keyframes also hold the full state so any snapshot can be rebuilt from a few rows
+    __tablename__ = "topology_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    taken_at = Column(BigInteger, nullable=False, index=True)  # epoch milliseconds
+    label = Column(String(100))
+    changes = Column(Integer, nullable=False)
+    delta = Column(LargeBinary(length=2**32 - 1), nullable=False)
+    state = Column(LargeBinary(length=2**32 - 1), nullable=True)
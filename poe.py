@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import models
+from db import session
+from leader import leadership
+from routeros_session import router_sessions
+
+
+POE_POLL_INTERVAL = float(os.getenv("POE_POLL_INTERVAL", "60"))
+POE_POLL_CONCURRENCY = int(os.getenv("POE_POLL_CONCURRENCY", "16"))
+# Where the polling worker publishes its readings for the other workers on the host
+POE_SNAPSHOT_PATH = os.getenv("POE_SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), "poe_snapshot.json"))
+
+
+def _to_float(value):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_poe_switches():
+    # One read of the PoE switches and their ports, shaped for joining by port number
+    db = session()
+    try:
+        switches = db.query(models.Switches).filter(models.Switches.POE == True).all()
+        return [
+            {
+                "id": s.id,
+                "name": s.name,
+                "IP": s.IP,
+                "floor": s.floor,
+                "ports": {
+                    p.port_number: {
+                        "id": p.id,
+                        "title": p.title,
+                        "device": {
+                            "id": p.device.id,
+                            "name": p.device.name,
+                            "type": p.device.type,
+                        } if p.device else None,
+                    }
+                    for p in s.ports
+                },
+            }
+            for s in switches
+            if s.IP
+        ]
+    finally:
+        db.close()
+
+
+def read_poe(host):
+    # Blocking RouterOS call: PoE settings plus one-shot monitor values for every PoE interface
+    with router_sessions.api(host) as api:
+        resource = api.get_resource('/interface/ethernet/poe')
+        interfaces = resource.get()
+        names = ",".join(i['name'] for i in interfaces if i.get('name'))
+        monitor = resource.call('monitor', {'numbers': names, 'once': ''}) if names else []
+
+    by_name = {i['name']: dict(i) for i in interfaces if i.get('name')}
+    for entry in monitor:
+        name = entry.get('name')
+        if name in by_name:
+            by_name[name].update(entry)
+    return list(by_name.values())
+
+
+def join_poe(switch, entries, polled_at):
+    ports = []
+    total_power = 0.0
+    for entry in entries:
+        name = entry.get('name', '')
+        port_number = int(name[5:]) if name.startswith('ether') and name[5:].isdigit() else None
+        port = switch["ports"].get(port_number) if port_number is not None else None
+        power = _to_float(entry.get('poe-out-power'))
+        if power:
+            total_power += power
+        ports.append({
+            "interface": name,
+            "port_number": port_number,
+            "port_id": port["id"] if port else None,
+            "title": port["title"] if port else None,
+            "device": port["device"] if port else None,
+            "poe_out": entry.get('poe-out'),
+            "status": entry.get('poe-out-status'),
+            "voltage": _to_float(entry.get('poe-out-voltage')),
+            "current": _to_float(entry.get('poe-out-current')),
+            "power": power,
+        })
+    ports.sort(key=lambda p: (p["port_number"] is None, p["port_number"] or 0, p["interface"]))
+    return {
+        "id": switch["id"],
+        "name": switch["name"],
+        "IP": switch["IP"],
+        "floor": switch["floor"],
+        "polled_at": polled_at,
+        "stale": False,
+        "error": None,
+        "total_power": round(total_power, 1),
+        "ports": ports,
+    }
+
+
+class PoeCache:
+    """In-memory PoE snapshot per switch, refreshed by a background poller.
+
+    Only the leader worker polls the switches (see leader.py); it publishes each round to
+    POE_SNAPSHOT_PATH and the other workers reload that file when it changes.
+    """
+
+    def __init__(self, interval=POE_POLL_INTERVAL, concurrency=POE_POLL_CONCURRENCY, path=POE_SNAPSHOT_PATH):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.path = path
+        self.switches = {}
+        self.polled_at = None
+        self._loaded_mtime = None
+        self._task = None
+
+    async def _poll_switch(self, switch, semaphore):
+        async with semaphore:
+            try:
+                entries = await asyncio.to_thread(read_poe, switch["IP"])
+            except Exception as e:
+                print(f"PoE poll failed for switch {switch['name']} ({switch['IP']}): {e}")
+                previous = self.switches.get(switch["id"])
+                if previous:
+                    # Keep serving the last good reading, flagged as stale
+                    return {**previous, "stale": True, "error": str(e)}
+                return {
+                    "id": switch["id"],
+                    "name": switch["name"],
+                    "IP": switch["IP"],
+                    "floor": switch["floor"],
+                    "polled_at": None,
+                    "stale": True,
+                    "error": str(e),
+                    "total_power": None,
+                    "ports": [],
+                }
+            return join_poe(switch, entries, time.time())
+
+    async def poll(self):
+        switches = await asyncio.to_thread(load_poe_switches)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._poll_switch(s, semaphore) for s in switches))
+        self.switches = {r["id"]: r for r in results}
+        self.polled_at = time.time()
+        await asyncio.to_thread(self._publish)
+        return self.switches
+
+    def _publish(self):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"polled_at": self.polled_at, "switches": list(self.switches.values())}, f)
+        os.replace(tmp, self.path)
+
+    def _refresh(self):
+        # Workers that don't poll serve the leader's last published round
+        if leadership.is_leader:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._loaded_mtime:
+                return
+            with open(self.path) as f:
+                published = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.switches = {s["id"]: s for s in published["switches"]}
+        self.polled_at = published["polled_at"]
+        self._loaded_mtime = mtime
+
+    async def run(self):
+        while True:
+            if leadership.is_leader:
+                try:
+                    await self.poll()
+                except Exception as e:
+                    print(f"PoE poller error: {e}")
+            router_sessions.evict_idle()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def summary(self):
+        self._refresh()
+        return {
+            "polled_at": self.polled_at,
+            "switches": [
+                {k: v for k, v in s.items() if k != "ports"}
+                for s in self.switches.values()
+            ],
+        }
+
+    def get(self, switch_id):
+        self._refresh()
+        return self.switches.get(switch_id)
+
+
+poe_cache = PoeCache()
@@ -0,0 +1,109 @@
+"""Atomic port linking.
+
+Each link or unlink is one conditional UPDATE: the port has to be free (or be at the
+version the caller last saw) and the unique constraints on `ports.device_id` and
+`patch_panel_ports.switch_port_id` reject a device or switch port that is taken.
+There is no read-then-write window, so two technicians editing at once get a clean
+409 instead of an IntegrityError or a silent overwrite.
+"""
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+UNCHANGED = object()  # leave the link as it is (patch panel cable-only edits)
+
+
+class PortNotFound(Exception):
+    pass
+
+
+class PortConflict(Exception):
+    def __init__(self, detail, current=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.current = current  # {"id", "linked_id", "version"} of the port as it is now, if it exists
+
+
+def _explain(db, model, where, linked_col, detail):
+    # Only reached when the UPDATE matched nothing: report why
+    row = db.execute(select(model.id, linked_col, model.version).where(*where)).first()
+    if row is None:
+        raise PortNotFound(f"{'Switch' if model is models.Ports else 'Patch Panel'} Port not found")
+    raise PortConflict(detail, {"id": row[0], "linked_id": row[1], "version": row[2]})
+
+
+def _apply(db, model, where, linked_col, target_id, expected_version, extra=None):
+    conditions = list(where)
+    if expected_version is not None:
+        conditions.append(model.version == expected_version)
+    elif target_id is not None and target_id is not UNCHANGED:
+        conditions.append(linked_col.is_(None))
+    values = {"version": model.version + 1, **(extra or {})}
+    if target_id is not UNCHANGED:
+        values[linked_col.key] = target_id
+    try:
+        with db.begin_nested():
+            result = db.execute(
+                update(model).where(*conditions).values(values).execution_options(synchronize_session=False)
+            )
+    except IntegrityError:
+        return None  # unique constraint: the device / switch port is linked elsewhere
+    return result.rowcount
+
+
+def link_switch_port(db, switch_id, port_number, device_id, expected_version=None):
+    """Link `device_id` to a switch port (None unlinks). Does not commit."""
+    P = models.Ports
+    where = (P.switch_id == switch_id, P.port_number == port_number)
+    if device_id is not None and db.get(models.Devices, device_id) is None:
+        raise PortNotFound("Device not found")
+    rowcount = _apply(db, P, where, P.device_id, device_id, expected_version)
+    if rowcount is None:
+        raise PortConflict("Device already connected to another port")
+    if rowcount == 0:
+        _explain(db, P, where, P.device_id,
+                 "Port was changed by someone else" if expected_version is not None else "Port already has a device")
+    return db.execute(select(P).where(*where).execution_options(populate_existing=True)).scalar_one()
+
+
+def link_patch_panel_port(db, patch_panel_id, port_number, switch_port_id, expected_version=None, cable_number=None, cable_length=None):
+    """Link a patch panel port to `switch_port_id` (None unlinks, UNCHANGED keeps it) and/or update its cable info. Does not commit."""
+    PP = models.PatchPanelPorts
+    where = (PP.patch_panel_id == patch_panel_id, PP.port_number == port_number)
+    if switch_port_id is not None and switch_port_id is not UNCHANGED and db.get(models.Ports, switch_port_id) is None:
+        raise PortNotFound("Switch Port not found")
+    extra = {}
+    if cable_number is not None:
+        extra["cable_number"] = cable_number
+    if cable_length is not None:
+        extra["cable_length"] = cable_length
+    rowcount = _apply(db, PP, where, PP.switch_port_id, switch_port_id, expected_version, extra)
+    if rowcount is None:
+        raise PortConflict("Switch Port already taken")
+    if rowcount == 0:
+        _explain(db, PP, where, PP.switch_port_id,
+                 "Port was changed by someone else" if expected_version is not None else "Patch Panel Port already linked")
+    return db.execute(select(PP).where(*where).execution_options(populate_existing=True)).scalar_one()
+
+
+def apply_links(db, changes):
+    """Apply many link changes in one transaction, in order; any failure rolls back all of them."""
+    applied = []
+    try:
+        for i, change in enumerate(changes):
+            try:
+                if change.switch_id is not None:
+                    port = link_switch_port(db, change.switch_id, change.port_number, change.device_id, change.expected_version)
+                    applied.append({"switch_id": port.switch_id, "port_number": port.port_number, "device_id": port.device_id, "version": port.version})
+                else:
+                    port = link_patch_panel_port(db, change.patch_panel_id, change.port_number, change.switch_port_id, change.expected_version)
+                    applied.append({"patch_panel_id": port.patch_panel_id, "port_number": port.port_number, "switch_port_id": port.switch_port_id, "version": port.version})
+            except (PortConflict, PortNotFound) as e:
+                e.index = i
+                raise
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return applied
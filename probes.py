@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+PROBE_BASE_INTERVAL = float(os.getenv("PROBE_BASE_INTERVAL", "30"))
+PROBE_FAST_INTERVAL = float(os.getenv("PROBE_FAST_INTERVAL", "5"))
+PROBE_MAX_INTERVAL = float(os.getenv("PROBE_MAX_INTERVAL", "900"))
+PROBE_BASE_TIMEOUT = float(os.getenv("PROBE_BASE_TIMEOUT", "0.5"))
+PROBE_MIN_TIMEOUT = float(os.getenv("PROBE_MIN_TIMEOUT", "0.2"))
+PROBE_JITTER = float(os.getenv("PROBE_JITTER", "0.2"))
+PROBE_FLAP_WINDOW = float(os.getenv("PROBE_FLAP_WINDOW", "600"))
+PROBE_FLAP_THRESHOLD = int(os.getenv("PROBE_FLAP_THRESHOLD", "3"))
+PING_COUNT = 1
+
+
+class _HostState:
+    def __init__(self, ip):
+        self.ip = ip
+        self.alive = None
+        self.failures = 0
+        self.rtt = None  # EWMA in ms
+        self.interval = 0.0
+        self.next_due = 0.0
+        self.changes = deque()
+        self.checks = ()  # liveness checks the last probe ran
+
+
+class ProbeScheduler:
+    """Per-host probe interval and timeout, tuned from each host's recent results."""
+
+    def __init__(
+        self,
+        base_interval=PROBE_BASE_INTERVAL,
+        fast_interval=PROBE_FAST_INTERVAL,
+        max_interval=PROBE_MAX_INTERVAL,
+        base_timeout=PROBE_BASE_TIMEOUT,
+        min_timeout=PROBE_MIN_TIMEOUT,
+        jitter=PROBE_JITTER,
+        flap_window=PROBE_FLAP_WINDOW,
+        flap_threshold=PROBE_FLAP_THRESHOLD,
+    ):
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.base_timeout = base_timeout
+        self.min_timeout = min_timeout
+        self.jitter = jitter
+        self.flap_window = flap_window
+        self.flap_threshold = flap_threshold
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, key, ip):
+        s = self._hosts.get(key)
+        if s is None or s.ip != ip:
+            # New host or readdressed device: start over and probe right away
+            s = self._hosts[key] = _HostState(ip)
+        return s
+
+    def is_due(self, key, ip, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._state(key, ip).next_due <= now
+
+    def timeout_for(self, key, ip):
+        with self._lock:
+            s = self._state(key, ip)
+            if s.alive is None or self._is_flapping(s, time.time()):
+                return self.base_timeout
+            if not s.alive:
+                # Only checking whether a dead host came back; don't wait the full timeout
+                return self.min_timeout
+            if s.rtt is None:
+                return self.base_timeout
+            return max(self.min_timeout, min(self.base_timeout, 4 * s.rtt / 1000.0))
+
+    def _is_flapping(self, s, now):
+        while s.changes and now - s.changes[0] > self.flap_window:
+            s.changes.popleft()
+        return len(s.changes) >= self.flap_threshold
+
+    def observe(self, key, ip, alive, rtt=None, now=None, checks=()):
+        now = time.time() if now is None else now
+        with self._lock:
+            s = self._state(key, ip)
+            s.checks = tuple(checks)
+            if s.alive is not None and s.alive != alive:
+                s.changes.append(now)
+            s.alive = alive
+            if alive:
+                s.failures = 0
+                if rtt is not None:
+                    s.rtt = rtt if s.rtt is None else 0.8 * s.rtt + 0.2 * rtt
+            else:
+                s.failures += 1
+
+            if self._is_flapping(s, now):
+                interval = self.fast_interval
+            elif alive:
+                interval = self.base_interval
+            else:
+                interval = min(self.max_interval, self.base_interval * 2 ** (s.failures - 1))
+            s.interval = interval
+            s.next_due = now + interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def retain(self, keys):
+        # Drop hosts that are no longer in the inventory so metrics stay accurate
+        keys = set(keys)
+        with self._lock:
+            for key in list(self._hosts):
+                if key not in keys:
+                    del self._hosts[key]
+
+    def metrics(self):
+        now = time.time()
+        with self._lock:
+            hosts = list(self._hosts.values())
+            flapping = sum(1 for s in hosts if self._is_flapping(s, now))
+        scheduled = [s for s in hosts if s.interval > 0]
+        probe_rate = sum(1.0 / s.interval for s in scheduled)
+        # Per check type, from what each host's last probe actually ran (TCP and bridge checks send no ICMP)
+        check_rate = {}
+        for s in scheduled:
+            for name in s.checks:
+                check_rate[name] = check_rate.get(name, 0.0) + 1.0 / s.interval
+        return {
+            "hosts": len(hosts),
+            "alive": sum(1 for s in hosts if s.alive),
+            "dead": sum(1 for s in hosts if s.alive is False),
+            "flapping": flapping,
+            "due_now": sum(1 for s in hosts if s.next_due <= now),
+            "expected_probes_per_second": round(probe_rate, 3),
+            "expected_checks_per_second": {name: round(rate, 3) for name, rate in sorted(check_rate.items())},
+            "icmp_packets_per_second": round(check_rate.get("icmp", 0.0) * PING_COUNT, 3),
+            "max_interval_hosts": sum(1 for s in hosts if s.interval >= self.max_interval),
+        }
+
+
+probe_scheduler = ProbeScheduler()
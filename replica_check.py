@@ -0,0 +1,88 @@
+"""Check read/write routing against a running server with a replica configured.
+
+    DATABASE_URL=... python replica_check.py --base-url http://127.0.0.1:3666 --reads 500
+
+Locally, two SQLite files work: start the server with DATABASE_URL=sqlite:///primary.db and
+DATABASE_REPLICA_URL=sqlite:///replica.db (copy primary.db to replica.db first). The copy
+never catches up, which is the worst case of replica lag.
+
+DATABASE_URL must point at the server's primary: the test device is removed directly.
+Checks that a client reads its own write right away (read-your-writes), on a plain read and
+on the cached /devices after another client has refilled the cache, then shows how a burst
+of GETs split between the engines according to /metrics/db.
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+
+import httpx
+
+import models
+from db import session
+
+
+def engine_counts(metrics):
+    return {name: e["statements"] for name, e in metrics["engines"].items()}
+
+
+async def run(base_url, reads, concurrency):
+    failures = []
+    name = f"replica-check-{uuid.uuid4().hex[:8]}"
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as writer:
+        r = await writer.post("/add/device", json={
+            "type": "CHECK", "name": name, "model": "-", "floor": 0, "place": "-",
+            "cableNumber": None, "Mac": None, "IP": None, "Notes": None, "show": False, "active": False,
+        })
+        if r.status_code != 201:
+            return [f"write failed: {r.status_code} {r.text}"], None
+        seen = any(d["name"] == name for d in (await writer.get("/devices/unlinked")).json())
+        if not seen:
+            failures.append("writer did not read its own write")
+        # The write invalidated the shared cache; a client without the cookie refills it first
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as other:
+            await other.get("/devices")
+        seen = any(d["name"] == name for d in (await writer.get("/devices")).json()["devices"])
+        if not seen:
+            failures.append("writer did not read its own write from the cached /devices")
+
+    before = (await httpx.AsyncClient(base_url=base_url).get("/metrics/db")).json()
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as readers:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return (await readers.get("/devices/unlinked")).status_code
+
+        codes = await asyncio.gather(*(one() for _ in range(reads)))
+        after = (await readers.get("/metrics/db")).json()
+    if any(c >= 500 for c in codes):
+        failures.append(f"{sum(c >= 500 for c in codes)} reads failed")
+
+    b, a = engine_counts(before), engine_counts(after)
+    split = {k: a[k] - b.get(k, 0) for k in a}
+
+    db = session()
+    try:
+        db.query(models.Devices).filter(models.Devices.name == name).delete()
+        db.commit()
+    finally:
+        db.close()
+    return failures, {"statements_during_reads": split, "routing": after["routing"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:3666")
+    parser.add_argument("--reads", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    failures, report = asyncio.run(run(args.base_url, args.reads, args.concurrency))
+    if report:
+        print(report)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
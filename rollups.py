@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from sqlalchemy import case, func, select
+
+import models
+
+
+def _floor():
+    return {
+        "devices": {"total": 0, "up": 0, "down": 0, "by_type": {}},
+        "switches": {"total": 0, "up": 0, "poe": 0},
+        "switch_ports": {"total": 0, "used": 0, "free": 0},
+        "patch_panel_ports": {"total": 0, "patched": 0, "unpatched": 0},
+    }
+
+
+def _add(into, floor):
+    d, s, sp, pp = into["devices"], into["switches"], into["switch_ports"], into["patch_panel_ports"]
+    d["total"] += floor["devices"]["total"]
+    d["up"] += floor["devices"]["up"]
+    d["down"] += floor["devices"]["down"]
+    for t, counts in floor["devices"]["by_type"].items():
+        bucket = d["by_type"].setdefault(t, {"up": 0, "down": 0})
+        bucket["up"] += counts["up"]
+        bucket["down"] += counts["down"]
+    for key in ("total", "up", "poe"):
+        s[key] += floor["switches"][key]
+    for key in ("total", "used", "free"):
+        sp[key] += floor["switch_ports"][key]
+    for key in ("total", "patched", "unpatched"):
+        pp[key] += floor["patch_panel_ports"][key]
+
+
+def build_rollup(db):
+    """Per-floor and site-wide counts from four GROUP BY queries; meant to be cached, not run per request."""
+    D, S, P, PP, PPP = models.Devices, models.Switches, models.Ports, models.PatchPanels, models.PatchPanelPorts
+    floors = defaultdict(_floor)
+
+    for floor, dtype, active, n in db.execute(
+        select(D.floor, D.type, D.active, func.count()).group_by(D.floor, D.type, D.active)
+    ):
+        f = floors[floor]["devices"]
+        state = "up" if active else "down"
+        f["total"] += n
+        f[state] += n
+        f["by_type"].setdefault(dtype or "UNKNOWN", {"up": 0, "down": 0})[state] += n
+
+    for floor, total, up, poe in db.execute(
+        select(
+            S.floor, func.count(),
+            func.sum(case((S.active == True, 1), else_=0)),
+            func.sum(case((S.POE == True, 1), else_=0)),
+        ).group_by(S.floor)
+    ):
+        floors[floor]["switches"].update({"total": total, "up": int(up or 0), "poe": int(poe or 0)})
+
+    for floor, total, used in db.execute(
+        select(S.floor, func.count(P.id), func.count(P.device_id)).join(P, P.switch_id == S.id).group_by(S.floor)
+    ):
+        floors[floor]["switch_ports"].update({"total": total, "used": used, "free": total - used})
+
+    for floor, total, patched in db.execute(
+        select(PP.floor, func.count(PPP.id), func.count(PPP.switch_port_id)).join(PPP, PPP.patch_panel_id == PP.id).group_by(PP.floor)
+    ):
+        floors[floor]["patch_panel_ports"].update({"total": total, "patched": patched, "unpatched": total - patched})
+
+    site = _floor()
+    for floor in floors.values():
+        _add(site, floor)
+    # JSON object keys are strings; None is for rows with no floor set
+    return {"site": site, "floors": {str(k): v for k, v in sorted(floors.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))}}
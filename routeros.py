@@ -1,9 +1,8 @@
 import routeros_api
 from collections import defaultdict
-connection = routeros_api.RouterOsApiPool('192.168.130.4', 'admin', '555288', plaintext_login=True)
-api = connection.get_api()
-resource = api.get_resource('/interface/bridge/host')
-all_hosts = resource.get()
+
+from secret import ROUTEROS_USERNAME, ROUTEROS_PLAINTEXT_LOGIN, routeros_password
+
 # Group MACs by port
 MAC_DEVICES = [
     "00:30:4F:BD:1B:5F",
@@ -465,32 +464,44 @@ MAC_DEVICES = [
     "FC:B6:9D:D3:C1:E5",
     "FC:B6:9D:D3:C1:EF",
 ]
-resource = api.get_resource('/interface/bridge/host')
-all_hosts = resource.get()
-#print(all_hosts)
-# Group MACs by port
-port_map = defaultdict(list)
-#print(len(MAC_DEVICES), "unconnected devices with MACs to check against.")
-for entry in all_hosts:
-    # 'on-interface' is the key field in /interface/bridge/host
-    port = entry.get('on-interface').strip("ether") if entry.get('on-interface') and entry.get('on-interface').startswith('ether') else None
-    mac = entry.get('mac-address')
-    # Skip entries missing port or mac
-    if not port or not mac:
-        print("here")
-        continue
-    # Ignore MACs that start with D4:01:C3 (case-insensitive)
-    print(mac)
-    if port.startswith('sfp') or (mac.upper().startswith('D4:01:C3') or mac.upper().startswith('18:FD:74') or mac.upper().startswith('C4:AD:34') or mac.upper().startswith("74:4D:28") or mac.upper().startswith("48:8F:5A")) :
-        continue
-    else:
-        port_map[port].append(mac)
-print(port_map)
-for port, macs in port_map.items():
-    if len(macs) == 1:
-        # Find the port object
-        print(f"Port {port} has a SINGLE device connected: {macs[0]}")
 
-    else:
-        print(f"Port {port} is an UPLINK/SWITCH (sees {macs} devices)")
-print(len(port_map), "ports with connected devices found.")
\ No newline at end of file
+
+def main():
+    connection = routeros_api.RouterOsApiPool('192.168.130.4', ROUTEROS_USERNAME, routeros_password(), plaintext_login=ROUTEROS_PLAINTEXT_LOGIN)
+    api = connection.get_api()
+    resource = api.get_resource('/interface/bridge/host')
+    all_hosts = resource.get()
+
+    resource = api.get_resource('/interface/bridge/host')
+    all_hosts = resource.get()
+    #print(all_hosts)
+    # Group MACs by port
+    port_map = defaultdict(list)
+    #print(len(MAC_DEVICES), "unconnected devices with MACs to check against.")
+    for entry in all_hosts:
+        # 'on-interface' is the key field in /interface/bridge/host
+        port = entry.get('on-interface').strip("ether") if entry.get('on-interface') and entry.get('on-interface').startswith('ether') else None
+        mac = entry.get('mac-address')
+        # Skip entries missing port or mac
+        if not port or not mac:
+            print("here")
+            continue
+        # Ignore MACs that start with D4:01:C3 (case-insensitive)
+        print(mac)
+        if port.startswith('sfp') or (mac.upper().startswith('D4:01:C3') or mac.upper().startswith('18:FD:74') or mac.upper().startswith('C4:AD:34') or mac.upper().startswith("74:4D:28") or mac.upper().startswith("48:8F:5A")) :
+            continue
+        else:
+            port_map[port].append(mac)
+    print(port_map)
+    for port, macs in port_map.items():
+        if len(macs) == 1:
+            # Find the port object
+            print(f"Port {port} has a SINGLE device connected: {macs[0]}")
+
+        else:
+            print(f"Port {port} is an UPLINK/SWITCH (sees {macs} devices)")
+    print(len(port_map), "ports with connected devices found.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import routeros_api
-connection = routeros_api.RouterOsApiPool('192.168.88.1', 'admin', 'Admin.555288', plaintext_login=True)
-api = connection.get_api()
 
-poe_interface = api.get_resource('/interface/ethernet/poe')
-poe_interface.set(id='ether5', poe_out='auto-on')
-print(poe_interface.get())
+from secret import ROUTEROS_USERNAME, ROUTEROS_PLAINTEXT_LOGIN, routeros_password
 
-connection.disconnect()
+
+if __name__ == "__main__":
+    connection = routeros_api.RouterOsApiPool('192.168.88.1', ROUTEROS_USERNAME, routeros_password(), plaintext_login=ROUTEROS_PLAINTEXT_LOGIN)
+    api = connection.get_api()
+
+    poe_interface = api.get_resource('/interface/ethernet/poe')
+    poe_interface.set(id='ether5', poe_out='auto-on')
+    print(poe_interface.get())
+
+    connection.disconnect()
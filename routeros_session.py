@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from routeros_api import RouterOsApiPool
+from routeros_api.exceptions import RouterOsApiConnectionError
+
+from secret import ROUTEROS_USERNAME, ROUTEROS_PLAINTEXT_LOGIN, routeros_password
+
+
+ROUTEROS_SOCKET_TIMEOUT = float(os.getenv("ROUTEROS_SOCKET_TIMEOUT", "5"))
+ROUTEROS_ACQUIRE_TIMEOUT = float(os.getenv("ROUTEROS_ACQUIRE_TIMEOUT", "10"))
+ROUTEROS_IDLE_TIMEOUT = float(os.getenv("ROUTEROS_IDLE_TIMEOUT", "300"))
+ROUTEROS_MAX_PER_HOST = int(os.getenv("ROUTEROS_MAX_PER_HOST", "2"))
+ROUTEROS_FAILURE_THRESHOLD = int(os.getenv("ROUTEROS_FAILURE_THRESHOLD", "3"))
+ROUTEROS_COOLDOWN = float(os.getenv("ROUTEROS_COOLDOWN", "60"))
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching the network while a host's circuit is open."""
+
+
+class _Host:
+    def __init__(self, host, max_connections):
+        self.host = host
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.idle = []  # [(pool, last_used)]
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_running = False
+
+
+class RouterSessionManager:
+    """Process-wide keep-alive RouterOS connections keyed by host IP."""
+
+    def __init__(
+        self,
+        username=ROUTEROS_USERNAME,
+        password=None,  # None: ROUTEROS_PASSWORD, read on first use
+        plaintext_login=ROUTEROS_PLAINTEXT_LOGIN,
+        socket_timeout=ROUTEROS_SOCKET_TIMEOUT,
+        acquire_timeout=ROUTEROS_ACQUIRE_TIMEOUT,
+        idle_timeout=ROUTEROS_IDLE_TIMEOUT,
+        max_per_host=ROUTEROS_MAX_PER_HOST,
+        failure_threshold=ROUTEROS_FAILURE_THRESHOLD,
+        cooldown=ROUTEROS_COOLDOWN,
+    ):
+        self.username = username
+        self.password = password
+        self.plaintext_login = plaintext_login
+        self.socket_timeout = socket_timeout
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.max_per_host = max_per_host
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        with self._lock:
+            h = self._hosts.get(host)
+            if h is None:
+                h = self._hosts[host] = _Host(host, self.max_per_host)
+            return h
+
+    def _check_circuit(self, h):
+        with self._lock:
+            if h.failures < self.failure_threshold:
+                return False
+            if time.monotonic() < h.open_until or h.trial_running:
+                raise CircuitOpenError(f"RouterOS host {h.host} is unreachable, retry later")
+            # Cooldown is over: let exactly one caller through as a half-open trial
+            h.trial_running = True
+            return True
+
+    def _record(self, h, ok, trial):
+        with self._lock:
+            if trial:
+                h.trial_running = False
+            if ok:
+                h.failures = 0
+                h.open_until = 0.0
+            else:
+                h.failures += 1
+                if h.failures >= self.failure_threshold:
+                    h.open_until = time.monotonic() + self.cooldown
+
+    def _take_pool(self, h, password):
+        with self._lock:
+            while h.idle:
+                pool, last_used = h.idle.pop()
+                if time.monotonic() - last_used < self.idle_timeout:
+                    return pool
+                pool.disconnect()
+        pool = RouterOsApiPool(
+            host=h.host,
+            username=self.username,
+            password=password,
+            plaintext_login=self.plaintext_login
+        )
+        pool.socket_timeout = self.socket_timeout
+        return pool
+
+    @contextmanager
+    def api(self, host):
+        """Borrow a logged-in RouterOS API for `host`, reusing a kept-alive connection when possible."""
+        password = self.password if self.password is not None else routeros_password()
+        h = self._host(host)
+        trial = self._check_circuit(h)
+        if not h.slots.acquire(timeout=self.acquire_timeout):
+            if trial:
+                with self._lock:
+                    h.trial_running = False
+            raise TimeoutError(f"Timed out waiting for a RouterOS connection to {host}")
+        pool = None
+        try:
+            pool = self._take_pool(h, password)
+            try:
+                api = pool.get_api()
+            except Exception:
+                pool.disconnect()
+                self._record(h, False, trial)
+                pool = None
+                raise
+            try:
+                yield api
+            except Exception as e:
+                # A reused socket may have been dropped by the router; don't keep it around
+                pool.disconnect()
+                pool = None
+                if _is_connection_error(e):
+                    self._record(h, False, trial)
+                elif trial:
+                    self._record(h, True, trial)
+                raise
+            self._record(h, True, trial)
+        finally:
+            if pool is not None:
+                with self._lock:
+                    h.idle.append((pool, time.monotonic()))
+            h.slots.release()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        evicted = 0
+        with self._lock:
+            for h in self._hosts.values():
+                keep = []
+                for pool, last_used in h.idle:
+                    if now - last_used >= self.idle_timeout:
+                        pool.disconnect()
+                        evicted += 1
+                    else:
+                        keep.append((pool, last_used))
+                h.idle = keep
+        return evicted
+
+    def close_all(self):
+        with self._lock:
+            for h in self._hosts.values():
+                for pool, _ in h.idle:
+                    pool.disconnect()
+                h.idle = []
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {
+                    "idle_connections": len(h.idle),
+                    "failures": h.failures,
+                    "circuit_open": h.failures >= self.failure_threshold and now < h.open_until,
+                    "retry_in": max(0.0, round(h.open_until - now, 1)),
+                }
+                for host, h in self._hosts.items()
+            }
+
+
+def _is_connection_error(e):
+    return isinstance(e, (OSError, RouterOsApiConnectionError))
+
+
+router_sessions = RouterSessionManager()
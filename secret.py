@@ -1,2 +1,20 @@
+import os
+
 SECRET_KEY = "IT.ADMIN.IT"
-ALGO = "H256"
\ No newline at end of file
+ALGO = "H256"
+
+# RouterOS API credentials shared by every switch/router call
+ROUTEROS_USERNAME = os.getenv("ROUTEROS_USERNAME", "admin")
+ROUTEROS_PASSWORD = os.getenv("ROUTEROS_PASSWORD")  # required, no default
+ROUTEROS_PLAINTEXT_LOGIN = os.getenv("ROUTEROS_PLAINTEXT_LOGIN", "1") == "1"
+
+
+def routeros_password():
+    """The RouterOS API password; raises when ROUTEROS_PASSWORD is unset.
+
+    Checked on first use rather than at import so offline tools (tests, benchmarks,
+    schema sync) run without it.
+    """
+    if not ROUTEROS_PASSWORD:
+        raise RuntimeError("ROUTEROS_PASSWORD is not set; export the RouterOS API password before talking to switches")
+    return ROUTEROS_PASSWORD
@@ -0,0 +1,64 @@
+"""Production entry point: python serve.py (main.py's __main__ stays the dev launcher with reload)."""
+import argparse
+import importlib.util
+import os
+
+import uvicorn
+
+
+def _has(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="Run the IT API with production settings")
+    p.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    p.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "3666")))
+    p.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", str(min(4, os.cpu_count() or 1)))))
+    p.add_argument("--loop", choices=["auto", "uvloop", "asyncio"], default=os.getenv("API_LOOP", "auto"))
+    p.add_argument("--http", choices=["auto", "httptools", "h11"], default=os.getenv("API_HTTP", "auto"))
+    p.add_argument("--keep-alive", type=int, default=int(os.getenv("API_KEEP_ALIVE", "15")),
+                   help="seconds to hold idle keep-alive connections")
+    p.add_argument("--backlog", type=int, default=int(os.getenv("API_BACKLOG", "2048")))
+    p.add_argument("--limit-concurrency", type=int, default=int(os.getenv("API_LIMIT_CONCURRENCY", "0")) or None,
+                   help="max concurrent connections per worker before answering 503")
+    p.add_argument("--graceful-timeout", type=int, default=int(os.getenv("API_GRACEFUL_TIMEOUT", "30")),
+                   help="seconds to wait for in-flight requests and background monitors on shutdown")
+    p.add_argument("--log-level", default=os.getenv("API_LOG_LEVEL", "info"))
+    p.add_argument("--access-log", action="store_true", default=os.getenv("API_ACCESS_LOG", "0") == "1")
+    return p
+
+
+def uvicorn_config(args):
+    loop = args.loop
+    if loop == "auto":
+        loop = "uvloop" if _has("uvloop") else "asyncio"
+    http = args.http
+    if http == "auto":
+        http = "httptools" if _has("httptools") else "h11"
+    return dict(
+        app="main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        limit_concurrency=args.limit_concurrency,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+        access_log=args.access_log,
+        proxy_headers=True,
+        reload=False,
+    )
+
+
+if __name__ == "__main__":
+    config = uvicorn_config(build_parser().parse_args())
+    print(f"Starting IT API: {config['workers']} workers, loop={config['loop']}, http={config['http']}")
+    # Every worker runs the app's lifespan; host-wide tasks (PoE polling, periodic snapshots,
+    # job schedules) only run in the one holding the leader lock, see leader.py.
+    # SIGTERM/SIGINT stop accepting connections, drain requests, then run the app's shutdown
+    # handlers, which stop the PoE poller, flush availability history and close RouterOS sessions.
+    uvicorn.run(**config)
@@ -0,0 +1,328 @@
+import asyncio
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sqlalchemy import func, select
+
+import models
+from db import named_lock, session
+from leader import leadership
+
+
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "3600"))
+SNAPSHOT_KEYFRAME_EVERY = int(os.getenv("SNAPSHOT_KEYFRAME_EVERY", "24"))
+
+NULL_ID = -1  # NULL foreign keys in int columns; NULL strings are stored as ""
+
+# relation -> (model, [(column name, model attribute, dtype kind)])
+RELATIONS = {
+    "ports": (models.Ports, [("device_id", models.Ports.device_id, "i")]),
+    "patch_panel_ports": (models.PatchPanelPorts, [("switch_port_id", models.PatchPanelPorts.switch_port_id, "i")]),
+    "devices": (models.Devices, [("ip", models.Devices.IP, "U"), ("mac", models.Devices.Mac, "U")]),
+}
+
+
+def _column(values, kind):
+    if kind == "i":
+        return np.array([NULL_ID if v is None else v for v in values], dtype=np.int64)
+    return np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+
+def _empty(kind):
+    return np.empty(0, dtype=np.int64 if kind == "i" else "<U1")
+
+
+def _pack(arrays):
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return buf.getvalue()
+
+
+def _unpack(blob):
+    with np.load(io.BytesIO(blob), allow_pickle=False) as npz:
+        return {k: npz[k] for k in npz.files}
+
+
+def _value(v):
+    v = v.item()
+    return None if v == NULL_ID or v == "" else v
+
+
+def read_state(db):
+    """Current topology as {relation: {"keys": sorted ids, column: values aligned with keys}}."""
+    state = {}
+    for rel, (model, columns) in RELATIONS.items():
+        rows = db.execute(select(model.id, *(attr for _, attr, _ in columns)).order_by(model.id)).all()
+        state[rel] = {"keys": np.array([r[0] for r in rows], dtype=np.int64)}
+        for i, (name, _, kind) in enumerate(columns, start=1):
+            state[rel][name] = _column([r[i] for r in rows], kind) if rows else _empty(kind)
+    return state
+
+
+def empty_state():
+    return {
+        rel: {"keys": np.empty(0, dtype=np.int64), **{name: _empty(kind) for name, _, kind in columns}}
+        for rel, (_, columns) in RELATIONS.items()
+    }
+
+
+def compute_delta(old, new):
+    """Rows added, removed or changed between two states, with both the old and the new values."""
+    delta = {}
+    for rel, (_, columns) in RELATIONS.items():
+        a, b = old[rel], new[rel]
+        _, ia, ib = np.intersect1d(a["keys"], b["keys"], assume_unique=True, return_indices=True)
+        changed = np.zeros(len(ia), dtype=bool)
+        for name, _, _ in columns:
+            changed |= a[name][ia] != b[name][ib]
+        removed = np.setdiff1d(np.arange(len(a["keys"])), ia, assume_unique=True)
+        added = np.setdiff1d(np.arange(len(b["keys"])), ib, assume_unique=True)
+        old_idx = np.concatenate([ia[changed], removed])
+        n_changed, n_removed, n_added = int(changed.sum()), len(removed), len(added)
+        d = {
+            "keys": np.concatenate([a["keys"][old_idx], b["keys"][added]]),
+            "old_present": np.concatenate([np.ones(n_changed + n_removed, bool), np.zeros(n_added, bool)]),
+            "new_present": np.concatenate([np.ones(n_changed, bool), np.zeros(n_removed, bool), np.ones(n_added, bool)]),
+        }
+        for name, _, kind in columns:
+            d["old_" + name] = np.concatenate([a[name][old_idx], np.full(n_added, NULL_ID if kind == "i" else "")])
+            d["new_" + name] = np.concatenate([b[name][ib[changed]], np.full(n_removed, NULL_ID if kind == "i" else ""), b[name][added]])
+        delta[rel] = d
+    return delta
+
+
+def apply_delta(state, delta):
+    """State after `delta`; rows it doesn't touch are carried over unchanged."""
+    result = {}
+    for rel, (_, columns) in RELATIONS.items():
+        s, d = state[rel], delta[rel]
+        keep = ~np.isin(s["keys"], d["keys"], assume_unique=True)
+        put = d["new_present"]
+        keys = np.concatenate([s["keys"][keep], d["keys"][put]])
+        order = np.argsort(keys, kind="stable")
+        result[rel] = {"keys": keys[order]}
+        for name, _, kind in columns:
+            values = np.concatenate([s[name][keep], d["new_" + name][put]])
+            result[rel][name] = values[order].astype(np.int64 if kind == "i" else str)
+    return result
+
+
+def compose_deltas(deltas):
+    """Fold consecutive deltas into one: first old value and last new value per key, no-ops dropped.
+
+    Only the delta rows are touched, so the cost grows with the number of changes,
+    not with the size of the inventory.
+    """
+    composed = {}
+    for rel, (_, columns) in RELATIONS.items():
+        parts = [d[rel] for d in deltas if len(d[rel]["keys"])]
+        if not parts:
+            composed[rel] = {"keys": np.empty(0, dtype=np.int64)}
+            continue
+        cat = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+        keys, first = np.unique(cat["keys"], return_index=True)
+        _, last_rev = np.unique(cat["keys"][::-1], return_index=True)
+        last = len(cat["keys"]) - 1 - last_rev
+        c = {
+            "keys": keys,
+            "old_present": cat["old_present"][first],
+            "new_present": cat["new_present"][last],
+        }
+        same = c["old_present"] == c["new_present"]
+        for name, _, _ in columns:
+            c["old_" + name] = cat["old_" + name][first]
+            c["new_" + name] = cat["new_" + name][last]
+            same &= ~c["old_present"] | (c["old_" + name] == c["new_" + name])
+        composed[rel] = {k: v[~same] for k, v in c.items()}
+    return composed
+
+
+def reverse_delta(delta):
+    """The delta that undoes `delta`: old and new values (and presence) swapped."""
+    reversed_ = {}
+    for rel, d in delta.items():
+        r = {"keys": d["keys"]}
+        for k, v in d.items():
+            if k.startswith("old_"):
+                r["new_" + k[4:]] = v
+            elif k.startswith("new_"):
+                r["old_" + k[4:]] = v
+        reversed_[rel] = r
+    return reversed_
+
+
+def describe_delta(delta):
+    out = {}
+    for rel, (_, columns) in RELATIONS.items():
+        d = delta[rel]
+        out[rel] = [
+            {
+                "id": int(d["keys"][i]),
+                "before": {name: _value(d["old_" + name][i]) for name, _, _ in columns} if d["old_present"][i] else None,
+                "after": {name: _value(d["new_" + name][i]) for name, _, _ in columns} if d["new_present"][i] else None,
+            }
+            for i in range(len(d["keys"]))
+        ]
+    return out
+
+
+def delta_size(delta):
+    return sum(len(d["keys"]) for d in delta.values())
+
+
+class TopologySnapshots:
+    """Periodic snapshots of port mappings and device addresses, stored as deltas with keyframes."""
+
+    def __init__(self, interval=SNAPSHOT_INTERVAL, keyframe_every=SNAPSHOT_KEYFRAME_EVERY):
+        self.interval = interval
+        self.keyframe_every = keyframe_every
+        self._lock = threading.Lock()
+        self._latest = None  # (snapshot id, state) of the newest stored snapshot
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="topology-snapshot")
+
+    def _meta(self, row):
+        return {"id": row.id, "taken_at": row.taken_at / 1000.0, "label": row.label, "changes": row.changes}
+
+    def take(self, label=None):
+        """Store a snapshot if anything changed since the last one; returns the newest snapshot's metadata."""
+        with self._lock:
+            db = session()
+            try:
+                # Serialized across workers too: two snapshots taken against the same last_id would
+                # store two deltas from one base, and composing them gives a wrong state
+                with named_lock(db, "topology_snapshots"):
+                    return self._take(db, label)
+            finally:
+                db.close()
+
+    def submit(self, label=None):
+        """take() on the snapshot thread, off the caller's path; returns a Future with its metadata."""
+        return self._executor.submit(self.take, label)
+
+    def _take(self, db, label):
+        T = models.TopologySnapshots
+        current = read_state(db)
+        last_id = db.execute(select(T.id).order_by(T.id.desc()).limit(1)).scalar()
+        if self._latest is None or self._latest[0] != last_id:
+            # First take, or another worker stored one since: rebuild our base from the table
+            self._latest = (last_id, self._state_at(db, last_id) if last_id else empty_state())
+        delta = compute_delta(self._latest[1], current)
+        changes = delta_size(delta)
+        if last_id is not None and changes == 0:
+            return self._meta(db.get(T, last_id))
+        keyframe_id = db.execute(select(T.id).where(T.state.is_not(None)).order_by(T.id.desc()).limit(1)).scalar()
+        since_keyframe = db.execute(select(func.count()).select_from(T).where(T.id > (keyframe_id or 0))).scalar()
+        keyframe = keyframe_id is None or since_keyframe + 1 >= self.keyframe_every
+        row = T(
+            taken_at=int(time.time() * 1000),
+            label=label,
+            changes=changes,
+            delta=_pack({f"{rel}.{k}": v for rel, d in delta.items() for k, v in d.items()}),
+            state=_pack({f"{rel}.{k}": v for rel, s in current.items() for k, v in s.items()}) if keyframe else None,
+        )
+        db.add(row)
+        db.commit()
+        self._latest = (row.id, current)
+        return self._meta(row)
+
+    @staticmethod
+    def _split(arrays):
+        out = {}
+        for key, value in arrays.items():
+            rel, name = key.split(".", 1)
+            out.setdefault(rel, {})[name] = value
+        return out
+
+    def _state_at(self, db, snapshot_id):
+        # Nearest keyframe at or before the snapshot, then the deltas after it
+        T = models.TopologySnapshots
+        keyframe = db.execute(
+            select(T.id, T.state).where(T.id <= snapshot_id, T.state.is_not(None)).order_by(T.id.desc()).limit(1)
+        ).first()
+        state = self._split(_unpack(keyframe.state)) if keyframe else empty_state()
+        for (blob,) in db.execute(
+            select(T.delta).where(T.id > (keyframe.id if keyframe else 0), T.id <= snapshot_id).order_by(T.id)
+        ):
+            state = apply_delta(state, self._split(_unpack(blob)))
+        return state
+
+    def list(self, limit=100):
+        T = models.TopologySnapshots
+        db = session()
+        try:
+            rows = db.execute(select(T.id, T.taken_at, T.label, T.changes).order_by(T.id.desc()).limit(limit)).all()
+        finally:
+            db.close()
+        return [self._meta(r) for r in rows]
+
+    def get(self, snapshot_id):
+        T = models.TopologySnapshots
+        db = session()
+        try:
+            row = db.execute(select(T.id, T.taken_at, T.label, T.changes).where(T.id == snapshot_id)).first()
+            if row is None:
+                return None
+            state = self._state_at(db, snapshot_id)
+        finally:
+            db.close()
+        return {
+            **self._meta(row),
+            **{
+                rel: {"id": s["keys"].tolist(), **{name: [_value(v) for v in s[name]] for name, _, _ in RELATIONS[rel][1]}}
+                for rel, s in state.items()
+            },
+        }
+
+    def latest_id(self):
+        T = models.TopologySnapshots
+        db = session()
+        try:
+            return db.execute(select(T.id).order_by(T.id.desc()).limit(1)).scalar()
+        finally:
+            db.close()
+
+    def diff(self, from_id, to_id):
+        """What changed between two snapshots, by composing only the deltas in between."""
+        reverse = from_id > to_id
+        lo, hi = (to_id, from_id) if reverse else (from_id, to_id)
+        T = models.TopologySnapshots
+        db = session()
+        try:
+            blobs = db.execute(select(T.delta).where(T.id > lo, T.id <= hi).order_by(T.id)).scalars().all()
+        finally:
+            db.close()
+        delta = compose_deltas([self._split(_unpack(b)) for b in blobs])
+        if reverse:
+            delta = reverse_delta(delta)
+        return {"from": from_id, "to": to_id, "changes": delta_size(delta), **describe_delta(delta)}
+
+    async def run(self):
+        while True:
+            # One worker per host takes the periodic ones (see leader.py)
+            if leadership.is_leader:
+                try:
+                    await asyncio.to_thread(self.take, "periodic")
+                except Exception as e:
+                    print(f"Topology snapshot failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+topology_snapshots = TopologySnapshots()
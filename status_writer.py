@@ -0,0 +1,116 @@
+import asyncio
+import os
+import threading
+import time
+
+from sqlalchemy import case, update
+
+import models
+from db import session
+
+
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "5"))
+STATUS_FLUSH_BATCH = int(os.getenv("STATUS_FLUSH_BATCH", "500"))
+
+TARGETS = {
+    "devices": models.Devices,
+    "switches": models.Switches,
+}
+
+
+class StatusWriter:
+    """Single writer for probe-driven active/show flags.
+
+    Requests report transitions and read them back as an overlay; a background task
+    persists them with one `UPDATE ... CASE` per table per interval, so GETs never write.
+    """
+
+    def __init__(self, flush_interval=STATUS_FLUSH_INTERVAL, flush_batch=STATUS_FLUSH_BATCH):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._pending = {}  # (target, id) -> (active, show) not yet written
+        self._inflight = {}  # being written right now, still part of the overlay
+        self._lock = threading.Lock()
+        self._task = None
+        self.on_flushed = []  # callbacks() run after transitions were written
+        self.stats = {"reported": 0, "written": 0, "flushes": 0, "failures": 0, "last_flush_seconds": None}
+
+    def report(self, target, target_id, active, show):
+        with self._lock:
+            self._pending[(target, target_id)] = (active, show)
+            self.stats["reported"] += 1
+
+    def overlay(self, target, target_id):
+        """(active, show) reported but not yet persisted, or None."""
+        with self._lock:
+            key = (target, target_id)
+            return self._pending.get(key) or self._inflight.get(key)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._inflight = pending
+        if not pending:
+            return 0
+        started = time.perf_counter()
+        db = session()
+        try:
+            for target, model in TARGETS.items():
+                rows = [(key[1], value) for key, value in pending.items() if key[0] == target]
+                for i in range(0, len(rows), self.flush_batch):
+                    chunk = dict(rows[i:i + self.flush_batch])
+                    db.execute(
+                        update(model)
+                        .where(model.id.in_(list(chunk)))
+                        .values(
+                            active=case({k: v[0] for k, v in chunk.items()}, value=model.id),
+                            show=case({k: v[1] for k, v in chunk.items()}, value=model.id),
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.stats["failures"] += 1
+            print(f"Status flush failed, keeping {len(pending)} transitions for retry: {e}")
+            with self._lock:
+                # Anything reported meanwhile is newer than what we failed to write
+                self._pending = {**pending, **self._pending}
+            return 0
+        finally:
+            db.close()
+            with self._lock:
+                self._inflight = {}
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(pending)
+        self.stats["last_flush_seconds"] = round(time.perf_counter() - started, 4)
+        for callback in self.on_flushed:
+            callback()
+        return len(pending)
+
+    def metrics(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, **self.stats}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+status_writer = StatusWriter()
@@ -0,0 +1,148 @@
+"""Concurrency stress test for port linking against a running server.
+
+    DATABASE_URL=... python stress_ports.py --base-url http://127.0.0.1:3666 --workers 32 --rounds 10
+
+DATABASE_URL must point at the server's database: fixtures (a switch, a patch panel
+and some devices) are created and removed directly. Every round races the workers on:
+
+  * many devices -> one free port        exactly one 200, the rest 409
+  * one device   -> many free ports      exactly one 200, the rest 409
+  * patch panel ports -> one switch port exactly one 200, the rest 409
+  * overlapping /ports/link batches      all-or-nothing, never a 5xx
+
+Exits non-zero on any 5xx or broken invariant.
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+from collections import Counter
+
+import httpx
+from sqlalchemy import func, select
+
+import models
+from db import session
+
+
+def create_fixtures(workers):
+    tag = uuid.uuid4().hex[:8]
+    db = session()
+    try:
+        switch = models.Switches(name=f"stress-{tag}", unique_id=f"stress-{tag}", total_ports=workers, floor=0)
+        panel = models.PatchPanels(title=f"stress-{tag}", unique_id=f"stress-{tag}", floor=0)
+        db.add_all([switch, panel])
+        db.flush()
+        db.add_all([models.Ports(switch_id=switch.id, port_number=i, title=f"stress-{tag}-P{i}") for i in range(1, workers + 1)])
+        db.add_all([models.PatchPanelPorts(patch_panel_id=panel.id, port_number=i) for i in range(1, workers + 1)])
+        devices = [models.Devices(name=f"stress-{tag}-{i}", type="STRESS", floor=0, show=False, active=False) for i in range(workers)]
+        db.add_all(devices)
+        db.commit()
+        return {"switch_id": switch.id, "panel_id": panel.id, "device_ids": [d.id for d in devices]}
+    finally:
+        db.close()
+
+
+def drop_fixtures(fx):
+    db = session()
+    try:
+        db.query(models.PatchPanelPorts).filter_by(patch_panel_id=fx["panel_id"]).delete()
+        db.query(models.Ports).filter_by(switch_id=fx["switch_id"]).delete()
+        db.query(models.Devices).filter(models.Devices.id.in_(fx["device_ids"])).delete()
+        db.query(models.PatchPanels).filter_by(id=fx["panel_id"]).delete()
+        db.query(models.Switches).filter_by(id=fx["switch_id"]).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def reset_links(fx):
+    db = session()
+    try:
+        db.query(models.PatchPanelPorts).filter_by(patch_panel_id=fx["panel_id"]).update({"switch_port_id": None})
+        db.query(models.Ports).filter_by(switch_id=fx["switch_id"]).update({"device_id": None})
+        db.commit()
+    finally:
+        db.close()
+
+
+def check_invariants(fx):
+    db = session()
+    try:
+        P = models.Ports
+        ports_per_device = db.execute(
+            select(P.device_id, func.count()).where(P.device_id.in_(fx["device_ids"])).group_by(P.device_id)
+        ).all()
+        return [f"device {d} linked to {n} ports" for d, n in ports_per_device if n > 1]
+    finally:
+        db.close()
+
+
+async def race(client, requests):
+    responses = await asyncio.gather(*(client.post(url, params=params, json=body) for url, params, body in requests))
+    return Counter(r.status_code for r in responses)
+
+
+async def run(base_url, workers, rounds):
+    fx = create_fixtures(workers)
+    sw, pp, devices = fx["switch_id"], fx["panel_id"], fx["device_ids"]
+    totals = Counter()
+    failures = []
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            for n in range(rounds):
+                scenarios = {
+                    "devices->one port": [(f"/switch/{sw}/port/1", {"device_id": d}, None) for d in devices],
+                    "one device->ports": [(f"/switch/{sw}/port/{p}", {"device_id": devices[0]}, None) for p in range(2, workers + 1)],
+                }
+                for name, requests in scenarios.items():
+                    reset_links(fx)
+                    counts = await race(client, requests)
+                    totals.update(counts)
+                    if counts[200] != 1 or counts[200] + counts[409] != len(requests):
+                        failures.append(f"round {n} {name}: {dict(counts)}")
+
+                # The patch panel ports all fight over switch port 1
+                db = session()
+                try:
+                    port1 = db.execute(select(models.Ports.id).where(models.Ports.switch_id == sw, models.Ports.port_number == 1)).scalar()
+                finally:
+                    db.close()
+                counts = await race(client, [(f"/patchpanel/{pp}/port/{i}", {"switch_port_id": port1}, None) for i in range(1, workers + 1)])
+                totals.update(counts)
+                if counts[200] != 1 or counts[200] + counts[409] != workers:
+                    failures.append(f"round {n} patch panel->one switch port: {dict(counts)}")
+
+                # Overlapping batches: each moves two devices onto two ports that neighbours also want
+                batches = [
+                    [
+                        {"switch_id": sw, "port_number": (i % workers) + 1, "device_id": None},
+                        {"switch_id": sw, "port_number": (i % workers) + 1, "device_id": devices[i]},
+                        {"switch_id": sw, "port_number": ((i + 1) % workers) + 1, "device_id": devices[(i + 1) % workers]},
+                    ]
+                    for i in range(workers)
+                ]
+                counts = await race(client, [("/ports/link", None, b) for b in batches])
+                totals.update(counts)
+                if any(code >= 500 for code in counts):
+                    failures.append(f"round {n} batches: {dict(counts)}")
+                failures.extend(f"round {n}: {problem}" for problem in check_invariants(fx))
+    finally:
+        drop_fixtures(fx)
+    return totals, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:3666")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    totals, failures = asyncio.run(run(args.base_url, args.workers, args.rounds))
+    print(f"responses: {dict(sorted(totals.items()))}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures or any(code >= 500 for code in totals) else 0)
@@ -0,0 +1,85 @@
+import uuid
+
+from fastapi.testclient import TestClient
+
+import models
+from db import Base, engine, session
+from main import app
+
+client = TestClient(app)
+
+
+def fixtures(ports=3):
+    Base.metadata.create_all(bind=engine)
+    tag = uuid.uuid4().hex[:8]
+    db = session()
+    try:
+        switch = models.Switches(name=f"test-{tag}", unique_id=f"test-{tag}", total_ports=ports, floor=0)
+        panel = models.PatchPanels(title=f"test-{tag}", unique_id=f"test-{tag}", floor=0)
+        db.add_all([switch, panel])
+        db.flush()
+        switch_ports = [models.Ports(switch_id=switch.id, port_number=i, title=f"test-{tag}-P{i}") for i in range(1, ports + 1)]
+        db.add_all(switch_ports)
+        db.add_all([models.PatchPanelPorts(patch_panel_id=panel.id, port_number=i) for i in range(1, ports + 1)])
+        devices = [models.Devices(name=f"test-{tag}-{i}", type="TEST", floor=0, show=False, active=False) for i in range(ports)]
+        db.add_all(devices)
+        db.commit()
+        return switch.id, panel.id, [p.id for p in switch_ports], [d.id for d in devices]
+    finally:
+        db.close()
+
+
+def link(switch_id, port, device_id, expected_version=None):
+    params = {"device_id": device_id}
+    if expected_version is not None:
+        params["expected_version"] = expected_version
+    return client.post(f"/switch/{switch_id}/port/{port}", params=params)
+
+
+def test_switch_port_link_and_conflicts():
+    switch_id, _, _, (d1, d2, _) = fixtures()
+    r = link(switch_id, 1, d1)
+    assert r.status_code == 200 and r.json()["device_id"] == d1
+    version = r.json()["version"]
+
+    # Taken port: detail stays a string, the port as it is now comes alongside
+    r = link(switch_id, 1, d2)
+    assert r.status_code == 409
+    assert r.json()["detail"] == "Port already has a device"
+    assert r.json()["current"]["linked_id"] == d1 and r.json()["current"]["version"] == version
+
+    # Device already on another port
+    r = link(switch_id, 2, d1)
+    assert r.status_code == 409 and isinstance(r.json()["detail"], str)
+
+    # A stale version loses, the current one wins
+    r = link(switch_id, 1, d2, expected_version=version - 1)
+    assert r.status_code == 409 and r.json()["detail"] == "Port was changed by someone else"
+    r = link(switch_id, 1, d2, expected_version=version)
+    assert r.status_code == 200 and r.json()["device_id"] == d2 and r.json()["version"] == version + 1
+
+
+def test_patch_panel_port_conflict():
+    _, panel_id, (p1, _, _), _ = fixtures()
+    r = client.post(f"/patchpanel/{panel_id}/port/1", params={"switch_port_id": p1})
+    assert r.status_code == 200
+    r = client.post(f"/patchpanel/{panel_id}/port/2", params={"switch_port_id": p1})
+    assert r.status_code == 409 and r.json()["detail"] == "Switch Port already taken"
+    r = client.post(f"/patchpanel/{panel_id}/port/1", params={"switch_port_id": p1})
+    assert r.status_code == 409 and r.json()["current"]["linked_id"] == p1
+
+
+def test_batch_is_all_or_nothing():
+    switch_id, _, _, (d1, d2, _) = fixtures()
+    assert link(switch_id, 3, d2).status_code == 200
+    r = client.post("/ports/link", json=[
+        {"switch_id": switch_id, "port_number": 1, "device_id": d1},
+        {"switch_id": switch_id, "port_number": 3, "device_id": d1},
+    ])
+    assert r.status_code == 409 and r.json()["index"] == 1 and isinstance(r.json()["detail"], str)
+    db = session()
+    try:
+        port = db.query(models.Ports).filter(models.Ports.switch_id == switch_id, models.Ports.port_number == 1).one()
+        assert port.device_id is None
+    finally:
+        db.close()
@@ -0,0 +1,60 @@
+import numpy as np
+
+import models
+from db import Base, engine, session
+from snapshots import RELATIONS, TopologySnapshots, compute_delta, describe_delta, empty_state, reverse_delta
+
+
+def by_id(described):
+    return {rel: sorted(rows, key=lambda r: r["id"]) for rel, rows in described.items()}
+
+
+def swapped(described):
+    return {rel: [{"id": r["id"], "before": r["after"], "after": r["before"]} for r in rows] for rel, rows in described.items()}
+
+
+def state(ports, devices):
+    s = empty_state()
+    s["ports"] = {"keys": np.array(sorted(ports), dtype=np.int64),
+                  "device_id": np.array([ports[k] for k in sorted(ports)], dtype=np.int64)}
+    s["devices"] = {"keys": np.array(sorted(devices), dtype=np.int64),
+                    "ip": np.array([devices[k][0] for k in sorted(devices)], dtype=str),
+                    "mac": np.array([devices[k][1] for k in sorted(devices)], dtype=str)}
+    return s
+
+
+def test_reverse_delta_matches_delta_the_other_way():
+    a = state({1: 10, 2: -1, 3: 11}, {10: ("10.0.0.1", ""), 11: ("", "AA:BB:CC:DD:EE:FF")})
+    b = state({1: -1, 2: 10, 4: 12}, {10: ("10.0.0.2", ""), 12: ("10.0.0.3", "")})
+    forward = by_id(describe_delta(compute_delta(a, b)))
+    backward = by_id(describe_delta(compute_delta(b, a)))
+    assert by_id(describe_delta(reverse_delta(compute_delta(a, b)))) == backward
+    assert swapped(forward) == backward
+
+
+def test_diff_is_symmetric():
+    Base.metadata.create_all(bind=engine)
+    snapshots = TopologySnapshots()
+    db = session()
+    try:
+        first = snapshots.take("first")["id"]
+        device = models.Devices(name="snapshot-test", type="TEST", floor=0, IP="10.9.9.9", show=False, active=False)
+        db.add(device)
+        db.flush()
+        switch = models.Switches(name="snapshot-test", unique_id="snapshot-test", total_ports=1, floor=0)
+        db.add(switch)
+        db.flush()
+        db.add(models.Ports(switch_id=switch.id, port_number=1, device_id=device.id))
+        db.commit()
+        second = snapshots.take("second")["id"]
+    finally:
+        db.close()
+
+    forward = snapshots.diff(first, second)
+    backward = snapshots.diff(second, first)
+    assert forward["changes"] == backward["changes"] == 2
+    rels = list(RELATIONS)
+    assert by_id(swapped({rel: forward[rel] for rel in rels})) == by_id({rel: backward[rel] for rel in rels})
+    # Rows added after `first` exist only on the "after" side going forward, only "before" going back
+    assert all(r["before"] is None for rel in rels for r in forward[rel])
+    assert all(r["after"] is None for rel in rels for r in backward[rel])